@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+
+"""
+Measures what building a validated Configuration costs, in
+gc-tracked objects and time per config, against the old way
+of building it (copying the config twice, once for the values
+and once for `original`, then converting in place), and against
+a ConfigRecord (a schema loaded with ``record=True``). Exits with
+status 1 if records are not as compact as they should be, i.e.
+if they have a ``__dict__``.
+
+Usage::
+
+   python benchmarks/bench_configuration.py [keys] [configs]
+"""
+
+import gc
+import sys
+import time
+from collections import OrderedDict
+
+import phyles
+
+def make_schema(keys, record=False):
+  spec = []
+  for i in xrange(keys):
+    spec.append(("key %d" % i, ["<float>", [0.0], None]))
+  return phyles.load_schema(spec, record=record)
+
+def legacy_validate(schema, config):
+  """
+  How configs were validated before `original` became lazy.
+  """
+  validated = phyles.Configuration()
+  OrderedDict.update(validated, config)
+  validated.original = OrderedDict(config)
+  for k, v in schema.items():
+    validated[k] = v[0](config[k])
+  return validated
+
+def objects_per_config(validate, schema, configs):
+  gc.collect()
+  before = len(gc.get_objects())
+  kept = [validate(schema, c) for c in configs]
+  after = len(gc.get_objects())
+  return (after - before) / float(len(kept))
+
+def seconds_per_config(validate, schema, configs):
+  start = time.time()
+  for c in configs:
+    validate(schema, c)
+  return (time.time() - start) / len(configs)
+
+def main():
+  keys = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+  n = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+  schema = make_schema(keys)
+  configs = [dict(("key %d" % i, [float(j)]) for i in xrange(keys))
+             for j in xrange(n)]
+  print "%d configs of %d keys" % (n, keys)
+  print "%-8s  %12s  %12s" % ("", "objects/cfg", "us/cfg")
+  records = make_schema(keys, record=True)
+  for name, validate, schema in (
+                 ("legacy", legacy_validate, schema),
+                 ("current", phyles.validate_config, schema),
+                 ("record", phyles.validate_config, records)):
+    objects = objects_per_config(validate, schema, configs)
+    seconds = seconds_per_config(validate, schema, configs)
+    print "%-8s  %12.1f  %12.1f" % (name, objects, seconds * 1e6)
+  record = records.validate_config(configs[0])
+  if hasattr(record, "__dict__"):
+    print "FAIL: %s has a __dict__" % type(record).__name__
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
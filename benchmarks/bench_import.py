@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+
+"""
+Measures the time taken by "import phyles" in fresh
+interpreters, and checks that importing phyles does not
+import the modules that phyles only imports when needed.
+
+Exits with status 1 if the best of the imports takes longer
+than `max_ms` milliseconds (default 50) or if any of those
+modules were imported, so it can be used to catch
+regressions of import time.
+
+Usage::
+
+   python benchmarks/bench_import.py [max_ms] [repeat]
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+"""
+Modules that "import phyles" must not import.
+"""
+LAZY = ["yaml", "pkg_resources", "argparse", "logging", "modulefinder",
+        "zipfile", "inspect", "pprint", "glob", "numpy"]
+
+SCRIPT = """
+import json, sys, time
+start = time.time()
+import phyles
+ms = (time.time() - start) * 1e3
+json.dump([ms, [m for m in %r if m in sys.modules]], sys.stdout)
+""" % (LAZY,)
+
+def import_once():
+  here = os.path.dirname(os.path.abspath(__file__))
+  env = dict(os.environ)
+  path = [os.path.dirname(here), env.get("PYTHONPATH", "")]
+  env["PYTHONPATH"] = os.pathsep.join([p for p in path if p])
+  out = subprocess.check_output([sys.executable, "-c", SCRIPT], env=env)
+  return json.loads(out)
+
+def main():
+  max_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+  results = [import_once() for _ in xrange(repeat)]
+  best = min(ms for ms, _ in results)
+  imported = sorted(set(m for _, loaded in results for m in loaded))
+  print "import phyles: %.1f ms (best of %d, limit %.0f ms)" % (best, repeat,
+                                                                max_ms)
+  failed = False
+  if imported:
+    print "imported eagerly: %s" % ", ".join(imported)
+    failed = True
+  if best > max_ms:
+    print "too slow"
+    failed = True
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
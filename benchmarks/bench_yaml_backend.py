@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+"""
+Compares the YAML backends (see phyles.set_yaml_backend)
+by reading a generated config with phyles.read_config.
+
+Usage::
+
+   python benchmarks/bench_yaml_backend.py [megabytes] [repeat]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+import phyles
+
+def make_config(path, megabytes):
+  """
+  Writes a config of about `megabytes` MB to `path`, with
+  one long list of floats per key, and returns its schema.
+  """
+  rng = random.Random(42)
+  spec = []
+  with open(path, "w") as f:
+    i = 0
+    while f.tell() < megabytes * 2 ** 20:
+      key = "parameter %d" % i
+      values = ", ".join(["%.6f" % rng.random() for _ in xrange(1000)])
+      f.write("%s : [%s]\n" % (key, values))
+      spec.append((key, ["<float>", [0.0], None]))
+      i += 1
+  return phyles.load_schema(spec)
+
+def read_uncached(schema, path):
+  """
+  Reads the config at `path`, parsing it every time
+  (see phyles.config_cache_info).
+  """
+  phyles.clear_config_cache()
+  return phyles.read_config(schema, path)
+
+def best_of(func, repeat):
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    func()
+    times.append(time.time() - start)
+  return min(times)
+
+def main():
+  megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+  fd, path = tempfile.mkstemp(suffix=".yml")
+  os.close(fd)
+  try:
+    schema = make_config(path, megabytes)
+    print "config: %.1f MB, %d keys" % (os.path.getsize(path) / 2.0 ** 20,
+                                        len(schema))
+    results = []
+    for backend in ("python", "libyaml"):
+      try:
+        phyles.set_yaml_backend(backend)
+      except ValueError as e:
+        print "%-8s  unavailable (%s)" % (backend, e)
+        continue
+      t = best_of(lambda: read_uncached(schema, path), repeat)
+      results.append(t)
+      print "%-8s  %8.3f s" % (backend, t)
+    if len(results) == 2:
+      print "speedup   %8.1fx" % (results[0] / results[1])
+  finally:
+    os.remove(path)
+
+if __name__ == "__main__":
+  main()
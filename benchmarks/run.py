@@ -0,0 +1,310 @@
+#! /usr/bin/env python
+
+"""
+Runs the benchmarks of the phyles hot paths on generated
+schemata, configs, and directory trees, writes the results as
+JSON, and optionally compares them with a stored baseline.
+
+Everything is generated with a fixed random seed in a temporary
+directory, so the suite runs offline and gives comparable results
+from run to run on the same machine. The default sizes run in
+well under a minute; ``--full`` runs the large sizes (schemata of up
+to 100,000 keys, configs of up to 50 MB, and trees of up to
+10^6 files), which takes much longer and needs a few GB of disk.
+The same configs are also read as JSON, pickle, marshal, and (if
+it is installed) msgpack, to compare with YAML.
+
+Usage::
+
+   python benchmarks/run.py [--full] [--repeat N] [--only SUBSTRING]
+                            [--output results.json]
+                            [--baseline baseline.json] [--tolerance 0.25]
+
+With ``--baseline``, each result is compared to the result of the
+same name in the baseline, and the exit status is 1 if any is slower
+by more than the tolerance (a fraction, default 0.25). Each
+benchmark is run once untimed before it is timed, but a single
+timed run (``--repeat 1``) still shows any other load on the
+machine, so compare with the default repeat. A baseline is
+just the output of an earlier run. ``benchmarks/baseline.json``
+was made with the default sizes and repeat, with msgpack
+installed, on the machine named in it; since timings depend on
+the machine, make a new baseline (with ``--output``) before
+measuring changes on another one.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import marshal
+import random
+import shutil
+import argparse
+import cPickle as pickle
+import tempfile
+import platform
+from collections import OrderedDict
+
+import phyles
+
+QUICK = {'keys': [10, 1000, 10000],
+         'config_bytes': [2 ** 10, 2 ** 20],
+         'files': [1000, 10000]}
+
+FULL = {'keys': [10, 100, 1000, 10000, 100000],
+        'config_bytes': [2 ** 10, 2 ** 20, 10 * 2 ** 20, 50 * 2 ** 20],
+        'files': [1000, 100000, 1000000]}
+
+def make_spec(keys, rng):
+  """
+  Returns the YAML text of a spec for a schema of `keys` keys,
+  with a mix of converters, and a config for it.
+  """
+  lines = ["!!omap"]
+  config = {}
+  for i in xrange(keys):
+    key = "key %d" % i
+    kind = i % 5
+    if kind == 0:
+      lines.append("- '%s' : [int, 1, null, 1]" % key)
+      config[key] = str(rng.randint(0, 1000))
+    elif kind == 1:
+      lines.append("- '%s' : [float, 1.0, 'A float.']" % key)
+      config[key] = rng.random()
+    elif kind == 2:
+      lines.append("- '%s' : [str, x, null, x]" % key)
+      config[key] = "value %d" % i
+    elif kind == 3:
+      lines.append("- '%s' : ['<float>', [1.0, 2.0], null]" % key)
+      config[key] = [rng.random() for _ in xrange(3)]
+    else:
+      lines.append("- '%s' : [[a, b, c], a, 'A choice.', a]" % key)
+      config[key] = rng.choice("abc")
+  return "\n".join(lines) + "\n", config
+
+def make_config_file(path, nbytes, rng):
+  """
+  Writes a config of about `nbytes` bytes to `path` as lists
+  of floats and returns the schema for it and the config.
+  """
+  spec = []
+  config = {}
+  with open(path, "w") as f:
+    i = 0
+    while f.tell() < nbytes:
+      n = max(1, min(1000, (nbytes - f.tell()) // 10))
+      values = ["%.6f" % rng.random() for _ in xrange(n)]
+      key = "parameter %d" % i
+      f.write("%s : [%s]\n" % (key, ", ".join(values)))
+      config[key] = [float(v) for v in values]
+      spec.append((key, ["<float>", [0.0], None]))
+      i += 1
+  age(path)
+  return phyles.load_schema(spec), config
+
+def age(path):
+  """
+  Makes the file `path` old enough for read_config
+  to cache (see config_cache_info).
+  """
+  past = time.time() - 60
+  os.utime(path, (past, past))
+
+def dumpers():
+  """
+  Returns the (extension, dump) of each config format other
+  than YAML, where msgpack is included only if installed.
+  """
+  formats = [(".json", json.dumps),
+             (".pickle", lambda c: pickle.dumps(c, pickle.HIGHEST_PROTOCOL)),
+             (".marshal", marshal.dumps)]
+  try:
+    import msgpack
+  except ImportError:
+    pass
+  else:
+    formats.append((".msgpack", msgpack.packb))
+  return formats
+
+def make_tree(root, files):
+  """
+  Makes a tree of `files` empty files under `root`, in
+  directories of at most 1000 files, two levels deep.
+  """
+  per_dir = 1000
+  for i in xrange(0, files, per_dir):
+    d = os.path.join(root, "d%03d" % (i // (per_dir * 100)),
+                           "d%05d" % (i // per_dir))
+    os.makedirs(d)
+    for j in xrange(i, min(files, i + per_dir)):
+      suffix = (".txt", ".tmp", ".dat")[j % 3]
+      open(os.path.join(d, "f%07d%s" % (j, suffix)), "w").close()
+
+def best_of(func, repeat):
+  """
+  Returns the best time of `repeat` calls of `func`, after a first
+  call that is not timed, so that caches, lazy imports, and the
+  memoized converters are warm even with a `repeat` of 1. As with
+  :mod:`timeit`, the garbage collector is off while timing.
+  """
+  func()
+  times = []
+  enabled = gc.isenabled()
+  gc.collect()
+  gc.disable()
+  try:
+    for _ in xrange(repeat):
+      start = time.time()
+      func()
+      times.append(time.time() - start)
+  finally:
+    if enabled:
+      gc.enable()
+  return min(times)
+
+def benchmarks(sizes, tmpdir):
+  """
+  Generates the (name, function) of each benchmark,
+  making the data each needs first.
+  """
+  rng = random.Random(42)
+  for keys in sizes['keys']:
+    spec, config = make_spec(keys, rng)
+    yield ("load_schema[keys=%d]" % keys,
+           lambda spec=spec: phyles.load_schema(spec, cache=False))
+    schema = phyles.load_schema(spec, cache=False)
+    yield ("sample_config[keys=%d]" % keys, schema.sample_config)
+    yield ("validate_config[keys=%d]" % keys,
+           lambda schema=schema, config=config:
+             schema.validate_config(config))
+    override = ", ".join(["'%s' : %s" % (k, json.dumps(v))
+                          for (k, v) in sorted(config.items())])
+    override = "{" + override + "}"
+    yield ("parse_override[keys=%d]" % keys,
+           lambda override=override: phyles.parse_override(override))
+  for nbytes in sizes['config_bytes']:
+    path = os.path.join(tmpdir, "config-%d.yml" % nbytes)
+    schema, config = make_config_file(path, nbytes, rng)
+    def _read(schema=schema, path=path):
+      phyles.clear_config_cache()
+      schema.read_config(path)
+    yield ("read_config[bytes=%d]" % nbytes, _read)
+    for ext, dump in dumpers():
+      other = os.path.splitext(path)[0] + ext
+      with open(other, "wb") as f:
+        f.write(dump(config))
+      age(other)
+      yield ("read_config_%s[bytes=%d]" % (ext[1:], nbytes),
+             lambda schema=schema, other=other: _read(schema, other))
+    del config
+    # warmed here so that even the first timed read is a hit
+    schema.read_config(path)
+    yield ("read_config_cached[bytes=%d]" % nbytes,
+           lambda schema=schema, path=path: schema.read_config(path))
+    phyles.compile_config(schema, path)
+    yield ("load_snapshot[bytes=%d]" % nbytes,
+           lambda schema=schema, path=path: phyles.load_snapshot(schema,
+                                                                 path))
+  def f(a, b, c=1, d=2, **kwargs):
+    return a
+  mapped = phyles.mapify(f)
+  amap = {'a': 1, 'b': 2, 'd': 4, 'extra': 5}
+  def _mapped():
+    for _ in xrange(10000):
+      mapped(amap)
+  yield ("mapify[calls=10000]", _mapped)
+  for files in sizes['files']:
+    root = os.path.join(tmpdir, "tree-%d" % files)
+    make_tree(root, files)
+    yield ("last_made[files=%d]" % files,
+           lambda root=root: phyles.last_made(root, suffix=".txt",
+                                              depth=None))
+    def _prune(root=root):
+      here = os.getcwd()
+      os.chdir(root)
+      try:
+        phyles.prune(["*.tmp"], doit=False)
+      finally:
+        os.chdir(here)
+    yield ("prune[files=%d]" % files, _prune)
+    archive = os.path.join(tmpdir, "tree-%d.zip" % files)
+    yield ("zipdir[files=%d]" % files,
+           lambda root=root, archive=archive: phyles.zipdir(root, archive))
+    shutil.rmtree(root)
+
+def compare(results, baseline, tolerance):
+  """
+  Prints the ratio of each result to the baseline and returns
+  the names of the results that are slower than allowed.
+  """
+  slower = []
+  print
+  print "%-36s %10s %10s %7s" % ("benchmark", "baseline", "now", "ratio")
+  for name, seconds in results.items():
+    if name not in baseline:
+      continue
+    ratio = seconds / baseline[name] if baseline[name] else float("inf")
+    flag = ""
+    # timings under a millisecond are mostly noise
+    if ratio > 1 + tolerance and max(seconds, baseline[name]) > 1e-3:
+      flag = "  SLOWER"
+      slower.append(name)
+    print "%-36s %10.4f %10.4f %7.2f%s" % (name, baseline[name],
+                                          seconds, ratio, flag)
+  return slower
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+  parser.add_argument("--full", action="store_true",
+                      help="run the large sizes too")
+  parser.add_argument("--repeat", type=int, default=3,
+                      help="runs of each benchmark (the best is kept)")
+  parser.add_argument("--only", default=None,
+                      help="run only benchmarks with this in their name")
+  parser.add_argument("--output", default=None,
+                      help="file to write the results to as JSON")
+  parser.add_argument("--baseline", default=None,
+                      help="JSON results of an earlier run to compare to")
+  parser.add_argument("--tolerance", type=float, default=0.25,
+                      help="allowed fraction slower than the baseline")
+  args = parser.parse_args()
+  sizes = FULL if args.full else QUICK
+  tmpdir = tempfile.mkdtemp(prefix="phyles-bench-")
+  results = OrderedDict()
+  # phyles imports these only when first needed, so import them
+  # here, or the first benchmark to need one is charged for it
+  for module in ("yaml", "numpy"):
+    try:
+      __import__(module)
+    except ImportError:
+      pass
+  try:
+    for name, func in benchmarks(sizes, tmpdir):
+      if args.only is not None and args.only not in name:
+        continue
+      results[name] = best_of(func, args.repeat)
+      print "%-36s %10.4f s" % (name, results[name])
+      sys.stdout.flush()
+  finally:
+    shutil.rmtree(tmpdir)
+  report = {'phyles': phyles.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'yaml_backend': phyles.get_yaml_backend(),
+            'repeat': args.repeat,
+            'results': results}
+  if args.output is not None:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2, sort_keys=True,
+                separators=(",", ": "))
+      f.write("\n")
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      baseline = json.load(f)['results']
+    if compare(results, baseline, args.tolerance):
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -6,18 +6,40 @@ Copyright (C) 2013  James C. Stroud
 All rights reserved.
 """
 
+from time import time as _clock
+_import_started = _clock()
+
 from _version import __version__
 
 from _phyles import *
 
 from terminalsize import get_terminal_size
 
+from _watcher import ConfigWatcher
+
+import _phyles
+# reported by set_up (see its `timings` argument)
+_phyles._import_seconds = _clock() - _import_started
+
 
-__all__ = ["Undefined", "Schema", "Configuration",
+__all__ = ["Undefined", "Schema", "Configuration", "LazyConfiguration",
+           "ConfigRecord",
            "read_schema", "load_schema",
-           "sample_config", "validate_config", "read_config",
+           "sample_config", "write_sample_config",
+           "validate_config", "validate_many",
+           "revalidate", "read_config", "read_configs", "read_many",
+           "schema_fingerprint", "compile_config", "load_snapshot",
+           "config_cache_info", "clear_config_cache",
+           "set_config_cache_size",
+           "ConverterProfile", "ConverterStats",
+           "enable_profiling", "disable_profiling",
            "last_made", "wait_exec", "doyn",
            "banner", "usage", "graceful", "get_home_dir",
-           "get_data_path", "prune", "default_argparser",
-           "package_spec", "set_up", "run_main", "mapify",
-           "get_terminal_size", "zipdir", "basic_logger"]
+           "get_data_path", "clear_data_path_cache",
+           "prune", "default_argparser",
+           "package_spec", "read_resource", "get_schema",
+           "clear_schemas", "set_up", "run_main", "mapify",
+           "Choices", "read_choices", "package_choices",
+           "get_terminal_size", "ConfigWatcher",
+           "zipdir", "basic_logger",
+           "set_yaml_backend", "get_yaml_backend"]
@@ -8,22 +8,19 @@ All rights reserved.
 
 from _version import __version__
 
+# Modules that are slow to import (e.g. yaml and pkg_resources)
+# or needed by only a few functions are imported by the
+# functions that use them, to keep "import phyles" fast.
 import os
 import sys
-import modulefinder
-import subprocess
 import textwrap
-import pprint
 import re
-import argparse
-import logging
-import glob
-import inspect
-from stat import S_ISREG, ST_CTIME, ST_MODE
-from contextlib import closing
-from zipfile import ZipFile, ZIP_DEFLATED
-
-import pkg_resources
+import hashlib
+import copy
+import bisect
+import itertools
+import time
+import threading
 
 try:
   # python 2.7
@@ -31,8 +28,13 @@ try:
 except ImportError:
   # python 2.6 (http://pypi.python.org/pypi/ordereddict)
   from ordereddict import OrderedDict
+import collections
+from collections import namedtuple, Mapping, MutableMapping
 
-import yaml
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
 
 """
 Name of the package
@@ -49,6 +51,23 @@ Environment variable for phyles pacakge data directory
 """
 PHYLES_DATA = "PHYLES_DATA"
 
+"""
+Environment variable for the phyles cache directory
+"""
+PHYLES_CACHE = "PHYLES_CACHE"
+
+"""
+Environment variable that selects the YAML backend
+(see :func:`set_yaml_backend`)
+"""
+PHYLES_YAML_BACKEND = "PHYLES_YAML_BACKEND"
+
+"""
+Suffix added to the name of a config file to name its snapshot
+(see :func:`compile_config`)
+"""
+SNAPSHOT_SUFFIX = ".snapshot"
+
 """
 Extension of phyles templates
 """
@@ -74,6 +93,11 @@ String that splits a setting into key and value.
 """
 SETTING_SPLIT = ":"
 
+"""
+Largest number of choices listed in full by sample_config.
+"""
+MAX_CHOICES_SHOWN = 20
+
 """
 Standard width and pad, in characters, for a CLI program.
 """
@@ -89,6 +113,21 @@ class DummyException(PhylesError):
 class ConfigError(PhylesError):
   pass
 
+class ConfigErrors(ConfigError):
+  """
+  A :class:`ConfigError` that holds every problem found in one
+  config as a :class:`list` of (key, message) :class:`tuples`
+  in the `errors` attribute. The key is ``None`` for problems
+  with the config as a whole.
+  """
+  def __init__(self, errors):
+    self.errors = list(errors)
+    lines = ["%s: %s" % (k, msg) if k is not None else msg
+             for (k, msg) in self.errors]
+    ConfigError.__init__(self, "\n".join(lines))
+  def __reduce__(self):
+    return (self.__class__, (self.errors,))
+
 class OptionError(PhylesError):
   pass
 
@@ -110,6 +149,51 @@ class Schema(OrderedDict):
        constructor (i.e. ``'__init__'``) is not yet advised
        or supported and may break forward compatibility.
   """
+  def _changing(self):
+    if self.__dict__.get('_frozen'):
+      _read_only(self)
+    self.__dict__.pop('_validator', None)
+    self.__dict__.pop('_profiled', None)
+    self.__dict__.pop('_fingerprint', None)
+  def __setitem__(self, key, value, *args, **kwargs):
+    self._changing()
+    OrderedDict.__setitem__(self, key, value, *args, **kwargs)
+  def __delitem__(self, key, *args, **kwargs):
+    self._changing()
+    OrderedDict.__delitem__(self, key, *args, **kwargs)
+  def clear(self):
+    self._changing()
+    OrderedDict.clear(self)
+  def freeze(self):
+    """
+    Makes the schema read-only, so that it can be shared
+    (e.g. by :func:`get_schema`), and returns it. Adding,
+    changing, or removing items of a frozen schema raises a
+    :class:`TypeError`, and its items become :class:`tuples`
+    so they can't be changed in place either.
+    """
+    _validator_for(self)
+    for k, v in self.items():
+      OrderedDict.__setitem__(self, k, tuple(v))
+    self._frozen = True
+    return self
+  def compile(self):
+    """
+    Builds the validator used by :func:`validate_config`,
+    with the allowed keys, converters and defaults resolved
+    ahead of time, and returns it. :func:`load_schema` calls
+    this for every schema it creates, and adding or removing
+    items triggers a rebuild on the next validation.
+
+    Call :meth:`compile` again only after changing
+    the items of the schema in place, e.g.
+    ``schema['width'][0] = int``.
+    """
+    if getattr(self, "_records", None) is not None:
+      self._record_type = _record_type(tuple(self))
+    self.__dict__.pop('_fingerprint', None)
+    self._validator = _compile_validator(self)
+    return self._validator
   def validate_config(self, *args, **kwargs):
     """
     This is a wrapper for :func:`validate_config` (see documentation
@@ -121,6 +205,39 @@ class Schema(OrderedDict):
        schema.validate_config(config)
     """
     return validate_config(self, *args, **kwargs)
+  def validate_many(self, *args, **kwargs):
+    """
+    This is a wrapper for :func:`validate_many` (see documentation
+    therein).
+
+    Comparison of usage with :func:`validate_many`::
+
+       phyles.validate_many(schema, configs)
+       schema.validate_many(configs)
+    """
+    return validate_many(self, *args, **kwargs)
+  def revalidate(self, *args, **kwargs):
+    """
+    This is a wrapper for :func:`revalidate` (see documentation
+    therein).
+
+    Comparison of usage with :func:`revalidate`::
+
+       phyles.revalidate(schema, config, changed)
+       schema.revalidate(config, changed)
+    """
+    return revalidate(self, *args, **kwargs)
+  def read_many(self, *args, **kwargs):
+    """
+    This is a wrapper for :func:`read_many` (see documentation
+    therein).
+
+    Comparison of usage with :func:`read_many`::
+
+       phyles.read_many(schema, paths)
+       schema.read_many(paths)
+    """
+    return read_many(self, *args, **kwargs)
   def read_config(self, *args, **kwargs):
     """
     This is a wrapper for :func:`read_config` (see documentation
@@ -131,7 +248,18 @@ class Schema(OrderedDict):
        phyles.read_config(schema, config)
        schema.read_config(config)
     """
-    return read_config
+    return read_config(self, *args, **kwargs)
+  def read_configs(self, *args, **kwargs):
+    """
+    This is a wrapper for :func:`read_configs` (see documentation
+    therein).
+
+    Comparison of usage with :func:`read_configs`::
+
+       phyles.read_configs(schema, config_file)
+       schema.read_configs(config_file)
+    """
+    return read_configs(self, *args, **kwargs)
   def sample_config(self, *args, **kwargs):
     """
     This is a wrapper for :func:`sample_config` (see documentation
@@ -143,6 +271,33 @@ class Schema(OrderedDict):
        schema.sample_config()
     """
     return sample_config(self, *args, **kwargs)
+  def write_sample_config(self, *args, **kwargs):
+    """
+    This is a wrapper for :func:`write_sample_config` (see
+    documentation therein).
+
+    Comparison of usage with :func:`write_sample_config`::
+
+       phyles.write_sample_config(schema, fileobj)
+       schema.write_sample_config(fileobj)
+    """
+    return write_sample_config(self, *args, **kwargs)
+  def converter_cache_info(self):
+    """
+    Returns a :class:`dict` keyed by converter name, with the
+    statistics of each memoized converter (see the `memoize`
+    argument of :func:`load_schema`) as a named :class:`tuple`
+    with the fields ``hits``, ``misses``, ``evictions``,
+    ``maxsize``, and ``currsize``.
+    """
+    info = {}
+    for v in self.itervalues():
+      if isinstance(v[0], _MemoizedConverter):
+        info[v[0].name] = v[0].cache_info()
+    return info
+
+def _read_only(schema):
+  raise TypeError("The schema is frozen (read-only).")
 
 class Configuration(OrderedDict):
   """
@@ -157,7 +312,11 @@ class Configuration(OrderedDict):
   Attributes:
     `original`: the original config as an :class:`OrderedDict`,
                 allowing the remembering of user input while
-                also allowing conversion
+                also allowing conversion; to keep validation
+                cheap, the :class:`OrderedDict` is only made from
+                the input when `original` is first read, so
+                changes made to the input in the meantime show up
+                in `original`
 
                 >>> colors = {'red': 'ff0000',
                 ...           'green': '00ff00',
@@ -177,20 +336,266 @@ class Configuration(OrderedDict):
        compatibility.
   """
   def __init__(self, config=None):
-    if config is None:
-      self.original = OrderedDict()
-    else:
+    OrderedDict.__init__(self)
+    # the input is only copied into original if original is read
+    self._source = config
+    self._original = None
+    if config is not None:
       try:
-        self.original = OrderedDict(config)
+        self.update(config)
       except (TypeError, ValueError) as e:
-        tmplt = ("Configuration Error:\n   '%s'\n" +
-                 "Configuration as parsed by pyyaml:\n-----\n%s")
-        msg = tmplt % (e, repr(config))
-        graceful(msg)
-    if config is None:
-      OrderedDict.__init__(self)
+        _bad_config(config, e)
+  @property
+  def original(self):
+    if self._original is None:
+      if self._source is None:
+        self._original = OrderedDict()
+      else:
+        self._original = OrderedDict(self._source)
+      self._source = None
+    return self._original
+  @original.setter
+  def original(self, value):
+    self._original = value
+    self._source = None
+
+def _bad_config(config, e):
+  tmplt = ("Configuration Error:\n   '%s'\n" +
+           "Configuration as parsed by pyyaml:\n-----\n%s")
+  msg = tmplt % (e, repr(config))
+  graceful(msg)
+
+class LazyConfiguration(Configuration):
+  """
+  A :class:`Configuration` whose values are converted on first
+  access, as created by :func:`validate_config` with
+  ``lazy=True``.
+
+  Missing and unknown entries are caught when the config is
+  validated, but each converter runs only when its value is first
+  read (e.g. with ``config[key]``, :meth:`get`, :meth:`items`,
+  or :meth:`values`). The converted value replaces the
+  unconverted one, so each converter runs at most once. A value
+  that fails to convert raises a :class:`ConfigError` when it
+  is read.
+
+  Call :meth:`force` to convert all values at once, e.g. to
+  fail fast on a bad config. :func:`repr` converts nothing, so
+  it never raises; it shows values not yet converted as
+  ``<unconverted ...>``.
+
+  .. warning::
+
+       Operations implemented in C that bypass item access,
+       such as ``dict(config)`` and ``f(**config)``, see the
+       unconverted values of entries that have not yet been read.
+       Call :meth:`force` first in such cases.
+  """
+  def __init__(self, config=None):
+    self._pending = {}
+    Configuration.__init__(self, config)
+  def __getitem__(self, key):
+    if key in self._pending:
+      converter = self._pending[key]
+      try:
+        value = converter(dict.__getitem__(self, key))
+      except (ValueError, TypeError, KeyError) as e:
+        raise ConfigError(str(e))
+      dict.__setitem__(self, key, value)
+      del self._pending[key]
+      return value
+    return dict.__getitem__(self, key)
+  def __setitem__(self, key, value, *args, **kwargs):
+    self._pending.pop(key, None)
+    Configuration.__setitem__(self, key, value, *args, **kwargs)
+  def __delitem__(self, key, *args, **kwargs):
+    self._pending.pop(key, None)
+    Configuration.__delitem__(self, key, *args, **kwargs)
+  def __eq__(self, other):
+    self.force()
+    if isinstance(other, LazyConfiguration):
+      other.force()
+    return Configuration.__eq__(self, other)
+  def __ne__(self, other):
+    return not self == other
+  def __reduce__(self):
+    self.force()
+    return Configuration.__reduce__(self)
+  def get(self, key, default=None):
+    if key in self:
+      return self[key]
+    return default
+  def __repr__(self):
+    items = []
+    for key in self:
+      value = dict.__getitem__(self, key)
+      if key in self._pending:
+        value = _Unconverted(value)
+      items.append((key, value))
+    if not items:
+      return "%s()" % (self.__class__.__name__,)
+    return "%s(%r)" % (self.__class__.__name__, items)
+  def force(self):
+    """
+    Converts every value not yet converted and returns the
+    config.
+
+    Raises: :class:`ConfigError` if any value fails to convert
+    """
+    for key in list(self._pending):
+      self[key]
+    return self
+
+class _Unconverted(object):
+  """
+  Shows a value of a :class:`LazyConfiguration` that is not yet
+  converted in its :func:`repr`.
+  """
+  __slots__ = ("value",)
+  def __init__(self, value):
+    self.value = value
+  def __repr__(self):
+    return "<unconverted %r>" % (self.value,)
+
+class ConfigRecord(object):
+  """
+  A compact alternative to :class:`Configuration` for holding
+  very many configs in memory, created by :func:`validate_config`
+  and friends if the schema was made by :func:`load_schema`
+  with ``record=True``.
+
+  Each schema gets its own subclass of :class:`ConfigRecord`
+  that knows the keys of the schema and their order, so a record
+  holds only a :class:`list` of the converted values. A record
+  is a mutable mapping, so it is used just like a
+  :class:`Configuration`, with the keys in the order of the
+  schema. Keys that are not in the schema can also be set
+  (e.g. by the program), and are kept in a :class:`dict` that
+  is only made when needed.
+
+  Attributes:
+    `original`: the original config as an :class:`OrderedDict`,
+                which is kept only if the schema was loaded with
+                ``keep_original=True``; otherwise, reading it
+                raises an :class:`AttributeError`
+  """
+  __slots__ = ("_values", "_original", "_extra")
+  _keys = ()
+  _index = {}
+  # the mixin methods of MutableMapping
+  get = Mapping.get.im_func
+  keys = Mapping.keys.im_func
+  items = Mapping.items.im_func
+  values = Mapping.values.im_func
+  iterkeys = Mapping.iterkeys.im_func
+  itervalues = Mapping.itervalues.im_func
+  iteritems = Mapping.iteritems.im_func
+  __eq__ = Mapping.__eq__.im_func
+  __ne__ = Mapping.__ne__.im_func
+  __hash__ = None
+  pop = MutableMapping.pop.im_func
+  popitem = MutableMapping.popitem.im_func
+  clear = MutableMapping.clear.im_func
+  update = MutableMapping.update.im_func
+  setdefault = MutableMapping.setdefault.im_func
+  def __init__(self, values, original=None):
+    self._values = values
+    self._original = original
+    self._extra = None
+  @property
+  def original(self):
+    if self._original is None:
+      msg = ("The original config was not kept " +
+             "(load the schema with keep_original=True).")
+      raise AttributeError(msg)
+    return self._original
+  def __getitem__(self, key):
+    i = self._index.get(key)
+    if i is None:
+      if self._extra is None:
+        raise KeyError(key)
+      return self._extra[key]
+    value = self._values[i]
+    if value is _missing:
+      raise KeyError(key)
+    return value
+  def __setitem__(self, key, value):
+    i = self._index.get(key)
+    if i is None:
+      if self._extra is None:
+        self._extra = OrderedDict()
+      self._extra[key] = value
     else:
-      OrderedDict.__init__(self, config)
+      self._values[i] = value
+  def __delitem__(self, key):
+    i = self._index.get(key)
+    if i is None:
+      if self._extra is None:
+        raise KeyError(key)
+      del self._extra[key]
+    elif self._values[i] is _missing:
+      raise KeyError(key)
+    else:
+      self._values[i] = _missing
+  def __contains__(self, key):
+    try:
+      self[key]
+    except KeyError:
+      return False
+    return True
+  def __iter__(self):
+    for key, value in itertools.izip(self._keys, self._values):
+      if value is not _missing:
+        yield key
+    if self._extra is not None:
+      for key in self._extra:
+        yield key
+  def __len__(self):
+    n = len(self._values) - self._values.count(_missing)
+    if self._extra is not None:
+      n += len(self._extra)
+    return n
+  def __repr__(self):
+    return "%s(%r)" % (self.__class__.__name__, self.items())
+  def __reduce__(self):
+    extra = None if self._extra is None else self._extra.items()
+    return (_rebuild_record,
+            (self._keys, self._values, self._original, extra))
+  def copy(self):
+    new = self.__class__(list(self._values), self._original)
+    if self._extra is not None:
+      new._extra = OrderedDict(self._extra)
+    return new
+
+# not a subclass: the ABCs have no __slots__, so records
+# would each get a __dict__ and __weakref__
+MutableMapping.register(ConfigRecord)
+
+"""
+Record classes (see ConfigRecord), keyed by the schema keys.
+"""
+_record_types = {}
+
+def _record_type(keys):
+  """
+  Returns the :class:`ConfigRecord` subclass for the :class:`tuple`
+  of schema `keys`, making it if needed.
+  """
+  try:
+    return _record_types[keys]
+  except KeyError:
+    pass
+  index = dict((k, i) for (i, k) in enumerate(keys))
+  namespace = {'__slots__': (), '__module__': __name__,
+               '_keys': keys, '_index': index}
+  rtype = type("ConfigRecord", (ConfigRecord,), namespace)
+  return _record_types.setdefault(keys, rtype)
+
+def _rebuild_record(keys, values, original, extra):
+  record = _record_type(keys)(values, original)
+  if extra is not None:
+    record._extra = OrderedDict(extra)
+  return record
 
 class Sentinel(object):
   """
@@ -206,9 +611,204 @@ class Sentinel(object):
     raise TypeError(msg)
   def __repr__(self):
     return self.name
+  def __reduce__(self):
+    # sentinels are module level singletons, so pickle by name
+    return self.name
 
 Undefined = Sentinel("Undefined")
 
+class Choices(object):
+  """
+  A converter that accepts only values from a (possibly very
+  large) enumeration of choices, such as one read from a file
+  by :func:`read_choices` or :func:`package_choices`.
+
+  The choices are loaded on first use and then kept in a hash
+  table, so checking a value takes the same time no matter how
+  many choices there are. A sorted copy of the choices is made
+  when first needed by :meth:`startswith`, e.g. to suggest
+  choices for a bad value.
+
+  Args:
+    `values`: an iterable of the choices, or a function taking no
+    arguments that returns one (to defer loading)
+
+    `source`: optional description of where the choices come from
+    (e.g. a file name), used in messages and by
+    :func:`sample_config`
+
+  A :class:`Choices` is used like any other converter::
+
+     elements = phyles.package_choices(phyles.Undefined, 'mypkg',
+                                       'package-data', 'elements.txt')
+     schema = phyles.load_schema(spec, {'element': elements})
+
+  .. note:: :func:`sample_config` lists only the first few
+            choices of a large enumeration.
+  """
+  def __init__(self, values, source=None):
+    self.source = source
+    self._values = values
+    self._set = None
+    self._sorted = None
+  def _load(self):
+    values = self._values
+    if callable(values):
+      values = values()
+    self._values = tuple(values)
+    self._set = frozenset(self._values)
+  @property
+  def choices(self):
+    return self
+  def __call__(self, value):
+    if value in self:
+      return value
+    msg = "Bad value ('%s')" % (value,)
+    if self.source is not None:
+      msg += ", not one of the choices in %s" % (self.source,)
+    if isinstance(value, basestring):
+      for n in xrange(len(value), 0, -1):
+        close = self.startswith(value[:n])[:5]
+        if close:
+          msg += " (perhaps: %s)" % ", ".join(close)
+          break
+    raise ValueError(msg + ".")
+  def __contains__(self, value):
+    if self._set is None:
+      self._load()
+    try:
+      return value in self._set
+    except TypeError:
+      return False
+  def __len__(self):
+    if self._set is None:
+      self._load()
+    return len(self._values)
+  def __iter__(self):
+    if self._set is None:
+      self._load()
+    return iter(self._values)
+  def startswith(self, prefix):
+    """
+    Returns a sorted :class:`list` of the choices that begin
+    with the :class:`str` `prefix`.
+    """
+    if self._sorted is None:
+      self._sorted = sorted(c for c in self if isinstance(c, basestring))
+    i = bisect.bisect_left(self._sorted, prefix)
+    found = []
+    for c in itertools.islice(self._sorted, i, None):
+      if not c.startswith(prefix):
+        break
+      found.append(c)
+    return found
+
+_CacheInfo = namedtuple("CacheInfo",
+                        "hits misses evictions maxsize currsize")
+
+class _LRUCache(object):
+  """
+  A mapping of at most `maxsize` items that forgets the least
+  recently used items first and counts hits and misses.
+  Safe to share between threads.
+  """
+  def __init__(self, maxsize):
+    self.maxsize = maxsize
+    self.data = OrderedDict()
+    self.hits = self.misses = self.evictions = 0
+    self.lock = threading.Lock()
+  def get(self, key, default=None, valid=None):
+    """
+    Returns the value for `key`, or `default` if there is none.
+    A value for which `valid` (if given) returns ``False`` is
+    forgotten and counted as a miss.
+    """
+    with self.lock:
+      try:
+        value = self.data.pop(key)
+      except KeyError:
+        self.misses += 1
+        return default
+      if valid is not None and not valid(value):
+        self.misses += 1
+        return default
+      self.data[key] = value
+      self.hits += 1
+      return value
+  def put(self, key, value):
+    with self.lock:
+      self.data.pop(key, None)
+      self.data[key] = value
+      self._evict()
+  def resize(self, maxsize):
+    with self.lock:
+      self.maxsize = maxsize
+      self._evict()
+  def _evict(self):
+    while len(self.data) > self.maxsize:
+      self.data.popitem(last=False)
+      self.evictions += 1
+  def clear(self):
+    with self.lock:
+      self.data.clear()
+  def info(self):
+    with self.lock:
+      return _CacheInfo(self.hits, self.misses, self.evictions,
+                        self.maxsize, len(self.data))
+
+_missing = Sentinel("_missing")
+
+"""
+Types of converted values that can be handed out without copying.
+"""
+_IMMUTABLE = (basestring, bool, int, long, float, complex,
+              type(None), frozenset)
+
+class _MemoizedConverter(object):
+  """
+  Wraps a `converter` with an :class:`_LRUCache` of `maxsize`
+  results (see the `memoize` argument of :func:`load_schema`).
+  The cache is locked, so a schema shared between threads (e.g.
+  by :func:`get_schema`) can validate in all of them at once; two
+  threads may both convert a value that is not yet cached.
+  """
+  def __init__(self, converter, name, maxsize):
+    if maxsize is True:
+      maxsize = 128
+    self.converter = converter
+    self.name = name
+    self.cache = _LRUCache(maxsize)
+    if hasattr(converter, "choices"):
+      self.choices = converter.choices
+  def __call__(self, value):
+    key = _memo_key(value)
+    if key is None:
+      return self.converter(value)
+    result = self.cache.get(key, _missing)
+    if result is _missing:
+      result = self.converter(value)
+      self.cache.put(key, result)
+    if isinstance(result, _IMMUTABLE):
+      return result
+    return copy.deepcopy(result)
+  def cache_info(self):
+    return self.cache.info()
+
+def _memo_key(value):
+  """
+  Returns a hashable key for `value` or ``None`` if there is none.
+  """
+  import yaml
+  try:
+    hash(value)
+  except TypeError:
+    try:
+      return ("yaml", type(value),
+              yaml.dump(value, Dumper=_yaml_dumper()))
+    except yaml.YAMLError:
+      return None
+  return (type(value), value)
+
 def atype_or_list_of_atype(atype):
   def _f(things):
     if atype is list:
@@ -239,6 +839,127 @@ def atype_or_list_of_atype(atype):
     return things
   return _f
 
+_ARRAY_CONVERTER = re.compile(r"^array\[\s*(\w+)\s*((?:,\s*(?:\d+|\*)\s*)*)\]$")
+
+def _abbrev(value, width=60):
+  """
+  Returns the :class:`str` of `value`, shortened to `width`
+  characters for use in messages.
+  """
+  r = str(value)
+  if len(r) > width:
+    r = r[:width - 3] + "..."
+  return r
+
+def _array_converter(name):
+  """
+  Returns the NumPy array converter for a converter `name`
+  such as ``'array[float, *, 3]'`` (see :func:`load_schema`).
+
+  Values for integer types must be whole numbers that fit the
+  type, and values for ``bool`` must be 0, 1, true, or false,
+  so that nothing is silently wrapped around or truncated.
+
+  >>> _array_converter('array[uint8]')([0, 255])
+  array([  0, 255], dtype=uint8)
+  >>> _array_converter('array[uint8]')([256])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[256]' has numbers out of range for uint8.
+  >>> _array_converter('array[int8]')([-128, 127])
+  array([-128,  127], dtype=int8)
+  >>> _array_converter('array[int8]')([-129])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[-129]' has numbers out of range for int8.
+  >>> _array_converter('array[int64]')([2 ** 63 - 1])
+  array([9223372036854775807])
+  >>> _array_converter('array[int64]')([2 ** 63])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[9223372036854775808L]' has numbers out of range for int64.
+  >>> _array_converter('array[int64]')([1e20])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[1e+20]' has numbers out of range for int64.
+  >>> _array_converter('array[uint64]')([2 ** 64 - 1])
+  array([18446744073709551615], dtype=uint64)
+  >>> _array_converter('array[uint64]')([2 ** 64])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[18446744073709551616L]' has numbers out of range for uint64.
+  >>> _array_converter('array[bool]')([True, 0, 1.0])
+  array([ True, False,  True])
+  >>> _array_converter('array[bool]')([2])
+  Traceback (most recent call last):
+  ...
+  ValueError: Value '[2]' has values that are not 0, 1, true, or false.
+  >>> _array_converter('array[int]')(['300'])
+  Traceback (most recent call last):
+  ...
+  TypeError: Value '['300']' can not be converted with 'array[int]'.
+  """
+  try:
+    import numpy
+  except ImportError:
+    msg = "The converter '%s' needs numpy, which is not installed." % name
+    _schema_error(msg)
+  m = _ARRAY_CONVERTER.match(name)
+  try:
+    dtype = numpy.dtype(m.group(1))
+  except TypeError:
+    _schema_error("No such array type: '%s'" % name)
+  shape = None
+  if m.group(2).strip():
+    shape = tuple(None if d.strip() == "*" else int(d)
+                  for d in m.group(2).split(",")[1:])
+  whole = dtype.kind in "iub"
+  def _f(things):
+    cant = "Value '%s' can not be converted with '%s'."
+    try:
+      if whole:
+        # infer the type first so that fractions are not truncated
+        a = numpy.array(things, ndmin=1)
+      else:
+        a = numpy.array(things, dtype=dtype, ndmin=1)
+    except (ValueError, TypeError):
+      raise TypeError(cant % (_abbrev(things), name))
+    if whole:
+      if (a.dtype.kind == "f") and not numpy.all(numpy.mod(a, 1) == 0):
+        msg = "Value '%s' has numbers that are not whole." % _abbrev(things)
+        raise ValueError(msg)
+      if (dtype.kind == "u") and (a.dtype.kind in "if") and (a < 0).any():
+        msg = "Value '%s' has negative numbers." % _abbrev(things)
+        raise ValueError(msg)
+      if a.dtype.kind not in "biufO":
+        raise TypeError(cant % (_abbrev(things), name))
+      if dtype.kind == "b":
+        if (a.dtype.kind != "b") and not numpy.all((a == 0) | (a == 1)):
+          tmplt = "Value '%s' has values that are not 0, 1, true, or false."
+          raise ValueError(tmplt % _abbrev(things))
+      elif a.size:
+        # as python ints, which compare exactly with any limit
+        try:
+          low, high = int(a.min()), int(a.max())
+        except (ValueError, TypeError):
+          raise TypeError(cant % (_abbrev(things), name))
+        info = numpy.iinfo(dtype)
+        if (low < info.min) or (high > info.max):
+          tmplt = "Value '%s' has numbers out of range for %s."
+          raise ValueError(tmplt % (_abbrev(things), dtype.name))
+      try:
+        a = numpy.ascontiguousarray(a, dtype=dtype)
+      except (ValueError, TypeError, OverflowError):
+        raise TypeError(cant % (_abbrev(things), name))
+    if shape is not None:
+      if ((a.ndim != len(shape)) or
+          any((d is not None) and (d != n) for (d, n) in zip(shape, a.shape))):
+        params = (_abbrev(things), a.shape, name)
+        msg = "Value '%s' has shape %s, which does not fit '%s'." % params
+        raise ValueError(msg)
+    return a
+  return _f
+
 def timestamp(d):
   try:
     t = d.timetuple()[:6]
@@ -289,6 +1010,96 @@ CONVERTERS = {'map' : dict,
               'timestamp' : timestamp,
               'slice' : slice_,}
 
+def _yaml_backends():
+  """
+  Returns an :class:`OrderedDict` of the available YAML
+  backends, keyed by name, with (loader, dumper) values.
+  The preferred backend comes first.
+  """
+  import yaml
+  backends = OrderedDict()
+  if getattr(yaml, "__with_libyaml__", False):
+    backends['libyaml'] = (yaml.CSafeLoader, yaml.CSafeDumper)
+  backends['python'] = (yaml.SafeLoader, yaml.SafeDumper)
+  return backends
+
+_yaml_backend = None
+
+def set_yaml_backend(name="auto"):
+  """
+  Selects the backend that phyles uses to parse and dump YAML.
+  The `name` is one of:
+
+    - ``'libyaml'``: the fast `LibYAML`_ bindings of `PyYAML`_
+      (:class:`yaml.CSafeLoader` and :class:`yaml.CSafeDumper`),
+      which are only available if PyYAML was built against LibYAML
+    - ``'python'``: the pure python :class:`yaml.SafeLoader`
+      and :class:`yaml.SafeDumper`
+    - ``'auto'``: ``'libyaml'`` if available, else ``'python'``
+
+  If no backend is selected explicitly, then phyles uses the
+  value of the ``PHYLES_YAML_BACKEND`` environment variable, or
+  ``'auto'`` if it is not set.
+
+  Both backends are "safe", meaning that they build only
+  plain python objects (e.g. :class:`dict`, :class:`list`,
+  :class:`str`, :class:`int`), so configs can not construct
+  arbitrary python objects with tags such as ``!!python/object``.
+
+  Args:
+    `name`: :class:`str`
+
+  Returns: the name of the selected backend as a :class:`str`
+
+  Raises: :class:`ValueError` if the backend is not available
+
+  .. _`LibYAML`: http://pyyaml.org/wiki/LibYAML
+  .. _`PyYAML`: http://pyyaml.org/
+  """
+  global _yaml_backend
+  backends = _yaml_backends()
+  if name == "auto":
+    name = backends.keys()[0]
+  if name not in backends:
+    tmplt = "YAML backend '%s' is not available (choose from: %s)."
+    msg = tmplt % (name, ", ".join(["auto"] + backends.keys()))
+    raise ValueError(msg)
+  _yaml_backend = (name,) + backends[name]
+  return name
+
+def get_yaml_backend():
+  """
+  Returns the name of the YAML backend in use
+  (see :func:`set_yaml_backend`).
+  """
+  if _yaml_backend is None:
+    set_yaml_backend(os.environ.get(PHYLES_YAML_BACKEND, "auto"))
+  return _yaml_backend[0]
+
+def _yaml_loader():
+  get_yaml_backend()
+  return _yaml_backend[1]
+
+def _yaml_dumper():
+  get_yaml_backend()
+  return _yaml_backend[2]
+
+def _yload(stream):
+  """
+  Parses the YAML text or file object `stream` with the
+  selected backend (see :func:`set_yaml_backend`).
+  """
+  import yaml
+  return yaml.load(stream, Loader=_yaml_loader())
+
+def _yload_all(stream):
+  """
+  Like :func:`_yload`, but lazily generates every document
+  in the `stream`.
+  """
+  import yaml
+  return yaml.load_all(stream, Loader=_yaml_loader())
+
 def unpack_omap(seq):
   """
   Takes `YAML seq <http://yaml.org/type/>`_
@@ -304,7 +1115,140 @@ def unpack_omap(seq):
     loaded = [tuple(i) for i in seq]
   return OrderedDict(loaded)
 
-def read_schema(yaml_file, converters=None):
+def _parse_spec(spec):
+  """
+  Turns the `spec` (described in :func:`load_schema`) into a
+  :class:`Schema` without binding any converters.
+  """
+  if spec is None:
+    spec = {}
+  import yaml
+  try:
+    loaded = Schema(spec)
+  except ValueError:
+    if (len(spec) > 0):
+      try:
+        try :
+          loaded = _yload(spec)
+        except yaml.constructor.ConstructorError as e:
+          _schema_error(e)
+        loaded = unpack_omap(loaded)
+      except AttributeError:
+        loaded = unpack_omap(spec)
+    else:
+      loaded = []
+    loaded = Schema(loaded)
+  # converters get bound into the items, so never share them with spec
+  return Schema((k, list(v)) for (k, v) in loaded.iteritems())
+
+def _cache_dir(cache):
+  """
+  Returns the cache directory for the `cache` setting
+  (described in :func:`load_schema`) or ``None`` if
+  caching is off.
+  """
+  if cache is None:
+    cache = os.environ.get(PHYLES_CACHE) or False
+  if cache is False:
+    return None
+  if cache is True:
+    cache = os.path.join(get_home_dir(), ".phyles", "cache")
+  return cache
+
+def _private_dir(dirpath):
+  """
+  Makes the directory `dirpath` (readable and writable only by
+  the user) if it does not exist, and returns ``True`` if it is
+  owned by the user and can not be written by anyone else, so
+  that the pickles in it were written by the user.
+  """
+  if not os.path.isdir(dirpath):
+    os.makedirs(dirpath, 0700)
+  if not hasattr(os, "getuid"):
+    return True
+  import stat
+  st = os.stat(dirpath)
+  return ((st.st_uid == os.getuid()) and
+          not (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)))
+
+def _owned(f):
+  """
+  Returns ``True`` if the open file `f` is owned by the user.
+  """
+  if not hasattr(os, "getuid"):
+    return True
+  return os.fstat(f.fileno()).st_uid == os.getuid()
+
+def _spec_key(spec, converters):
+  """
+  Returns a hex digest that identifies the YAML text `spec`
+  together with the phyles version and the names of
+  the `converters`.
+  """
+  if isinstance(spec, unicode):
+    spec = spec.encode("utf-8")
+  if converters is None:
+    names = []
+  else:
+    names = sorted(str(n) for n in converters)
+  h = hashlib.sha1()
+  h.update(spec)
+  h.update("\0" + __version__)
+  for name in names:
+    h.update("\0" + name)
+  return h.hexdigest()
+
+def _cached_spec(spec, converters=None, cache=None):
+  """
+  Like :func:`_parse_spec` for YAML text `spec`, but uses the
+  on-disk cache described in :func:`load_schema`.
+
+  The cache file for a spec is named by :func:`_spec_key`,
+  so any change to the YAML text (or to the phyles version or
+  converter names) gets a fresh entry. Problems reading or
+  writing the cache are logged and otherwise ignored.
+
+  Cache files are pickles, which can run code when loaded, so
+  the cache is used only if its directory belongs to the user
+  and no one else can write to it (see :func:`_private_dir`),
+  and only cache files owned by the user are loaded.
+  """
+  dirpath = _cache_dir(cache)
+  if dirpath is None:
+    return _parse_spec(spec)
+  import logging
+  try:
+    private = _private_dir(dirpath)
+  except OSError as e:
+    logging.debug("Could not make schema cache '%s': %s", dirpath, e)
+    return _parse_spec(spec)
+  if not private:
+    logging.warning("Not using schema cache '%s', which other " +
+                    "users could write to.", dirpath)
+    return _parse_spec(spec)
+  key = _spec_key(spec, converters)
+  path = os.path.join(dirpath, "schema-%s.pickle" % key)
+  try:
+    with open(path, "rb") as f:
+      if not _owned(f):
+        raise IOError("owned by another user")
+      cached_key, items = pickle.load(f)
+    if cached_key == key:
+      return Schema(items)
+  except Exception as e:
+    if os.path.exists(path):
+      logging.debug("Ignoring schema cache '%s': %s", path, e)
+  loaded = _parse_spec(spec)
+  try:
+    tmp = "%s.%s.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+      pickle.dump((key, loaded.items()), f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, path)
+  except (OSError, IOError, pickle.PicklingError) as e:
+    logging.debug("Could not write schema cache '%s': %s", path, e)
+  return loaded
+
+def read_schema(yaml_file, converters=None, cache=None):
   """
   Loads the schema specified in the file named
   in `yaml_file`. This function simply opens
@@ -319,16 +1263,20 @@ def read_schema(yaml_file, converters=None):
          a :class:`dict` of converters keyed by config entry names,
          as described in :func:`load_schema`
 
+    `cache`: the on-disk cache setting, as described in
+    :func:`load_schema`
+
   Returns:
        a :class:`Schema` as described in :func:`load_schema`
     
   """
   with open(yaml_file) as f:
     y = f.read()
-  loaded = load_schema(y, converters)
+  loaded = load_schema(y, converters, cache=cache)
   return loaded
 
-def load_schema(spec, converters=None):
+def load_schema(spec, converters=None, cache=None, memoize=None,
+                                    record=False, keep_original=False):
   """
   Creates a :class:`Schema` from the specification, `spec`.
 
@@ -404,6 +1352,9 @@ def load_schema(spec, converters=None):
         A :class:`dict` of `callables`_ keyed by converter name
         (which must match the converter names in `spec`), The
         callables convert values from the actual config.
+        Instead of a callable, a converter may be given as a
+        reference of the form ``'package.module:name'``, which
+        is imported when the schema is loaded.
 
         Converters that correspond to several native
         `python types`_ and `YAML types`_
@@ -443,6 +1394,60 @@ def load_schema(spec, converters=None):
                   according to the `YAML types`_ specification
                   in a YAML representation of a config.
 
+        If `NumPy`_ is installed, sequences of numbers can be
+        converted into contiguous :class:`numpy.ndarray` objects
+        in one step with converters named
+        ``'array[dtype]'`` or ``'array[dtype, shape]'``, where
+        ``dtype`` is any NumPy type name (e.g. ``float``,
+        ``int``, ``float32``, ``uint8``, ``complex``, ``bool``)
+        and ``shape`` is a comma separated list of the sizes of
+        the dimensions, with ``*`` for any size. For example,
+        ``'array[float]'`` accepts any sequence (or a single
+        number, as for the ``<type>`` converters),
+        ``'array[int, 3]'`` accepts exactly three integers and
+        ``'array[float, *, 3]'`` accepts any number of
+        triples. Values for integer types must be whole numbers
+        within the range of the type, and values for ``bool``
+        must be 0, 1, true, or false.
+
+    `cache`:
+        Only used if `spec` is YAML text. If `cache` is ``True``
+        or the name of a directory, then the parsed specification
+        is kept on disk, so that later calls with the same YAML
+        text (and the same converter names) skip parsing and only
+        bind the converters. If `cache` is ``None`` (the default),
+        the cache is used only if the ``PHYLES_CACHE`` environment
+        variable names a directory. A value of ``False`` turns
+        the cache off. A cache directory that other users can
+        write to is not used.
+
+    `memoize`:
+        If given, each converter in `converters` remembers its
+        most recent results, so a value that was seen before is
+        not converted again. The `memoize` argument is the number
+        of results to remember per converter (the least recently
+        used results are forgotten first), or ``True`` for 128.
+        Hashable values are remembered by value, others by their
+        YAML representation; values that can be neither (rare
+        for configs read from YAML) are always converted.
+        Results that are not immutable (e.g. :class:`list`) are
+        copied before they are handed out. The built in converters
+        are cheap and are not memoized. See
+        :meth:`Schema.converter_cache_info` for the hit rates.
+
+    `record`:
+        If ``True``, configs validated with the schema are
+        compact :class:`ConfigRecord` objects rather than
+        :class:`Configuration` objects, which saves a lot of memory
+        when many configs are held at once. Lazy validation
+        (see :func:`validate_config`) still makes
+        :class:`LazyConfiguration` objects.
+
+    `keep_original`:
+        Only used if `record` is ``True``. If ``True``, records
+        keep a copy of the original config (see
+        :class:`ConfigRecord`), which otherwise is not kept.
+
   Returns:
     A fully constructed schema in the form of a
     :class:`Schema`. Most notably, the strings specifying
@@ -486,53 +1491,64 @@ def load_schema(spec, converters=None):
   .. _`YAML timestamp`: http://yaml.org/type/timestamp.html
   .. _`YAML types`: http://yaml.org/type/
   .. _`python types`: http://docs.python.org/2/library/types.html
+  .. _`NumPy`: http://www.numpy.org/
   """
-  if spec is None:
-    spec = {}
-  try:
-    loaded = Schema(spec)
-  except ValueError:
-    if (len(spec) > 0):
-      try:
-        try :
-          loaded = yaml.load(spec)
-        except yaml.constructor.ConstructorError as e:
-          _schema_error(e)
-        loaded = unpack_omap(loaded)
-      except AttributeError:
-        loaded = unpack_omap(spec)
-    else:
-      loaded = []
-    loaded = Schema(loaded)
-  convs = CONVERTERS.copy()
+  if isinstance(spec, basestring):
+    loaded = _cached_spec(spec, converters, cache)
+    source = spec
+  else:
+    loaded = _parse_spec(spec)
+    source = [(k, list(v)) for (k, v) in loaded.iteritems()]
+  # only the given converters are collected, CONVERTERS is not copied
+  convs = {}
+  def _find(name):
+    try:
+      return convs[name]
+    except KeyError:
+      return CONVERTERS[name]
   if converters is not None:
-    convs.update(converters)
+    for name, converter in converters.items():
+      if isinstance(converter, basestring):
+        try:
+          converter = _resolve_ref(converter)
+        except (ImportError, AttributeError, ValueError) as e:
+          msg = "Can't find converter '%s' (%s)." % (converter, e)
+          _schema_error(msg)
+      if memoize:
+        converter = _MemoizedConverter(converter, name, memoize)
+      convs[name] = converter
+  names = {}
   for k, v in loaded.items():
     converter = v[0]
     if not (3 <= len(v) <= 4):
       msg = "Item '%s' of specification is not valid." % k
       _schema_error(msg)
+    if isinstance(converter, basestring):
+      names[k] = converter
+    elif hasattr(converter, 'keys'):
+      names[k] = "(mapping)"
+    else:
+      names[k] = "(choices)"
     try:
-      loaded[k][0] = convs[converter]
+      loaded[k][0] = _find(converter)
     except (TypeError, KeyError):
       if hasattr(converter, 'keys'):
-        def _converter(i, key=k, c=converter):
-          if i in c:
+        def _converter(i, key=k, c=dict(converter)):
+          try:
             return c[i]
-          else:
+          except (KeyError, TypeError):
             msg = "Bad value ('%s') for option '%s'." % (i, key)
             raise KeyError(msg)
         _converter.choices = tuple(converter)
         loaded[k][0] = _converter
       elif isinstance(converter, basestring):
-        if converter.startswith("<") and converter.endswith(">"):
-          atype = converter[1:-1]
-          if atype in convs:
-            loaded[k][0] = atype_or_list_of_atype(convs[atype])
-            no_such_converter = False
+        atype = converter[1:-1]
+        if (converter.startswith("<") and converter.endswith(">") and
+            (atype in convs or atype in CONVERTERS)):
+          loaded[k][0] = atype_or_list_of_atype(_find(atype))
+        elif _ARRAY_CONVERTER.match(converter):
+          loaded[k][0] = _array_converter(converter)
         else:
-            no_such_converter = True
-        if no_such_converter:
           msg = "No such converter: '%s'" % converter
           _schema_error(msg)
       else:
@@ -542,22 +1558,37 @@ def load_schema(spec, converters=None):
           msg = "%s is not mapping, sequence or in converters." % v
           raise ConfigError(msg)
         else:
-          def _converter(value, key=k, c=converter):
-            if value in c:
-              return value
-            else:
-              msg = "Bad value ('%s') for option '%s'." % (value, key)
-              raise ValueError(msg)
+          try:
+            c = frozenset(converter)
+          except TypeError:
+            c = list(converter)
+          def _converter(value, key=k, c=c):
+            try:
+              if value in c:
+                return value
+            except TypeError:
+              pass
+            msg = "Bad value ('%s') for option '%s'." % (value, key)
+            raise ValueError(msg)
           _converter.choices = tuple(converter)
           loaded[k][0] = _converter
+  # converter names as given in the spec (see ConverterProfile)
+  loaded._names = names
+  if record:
+    loaded._records = {'keep_original': keep_original}
+  loaded.compile()
+  # remembered so the schema can be rebuilt elsewhere (see read_many)
+  loaded._source = (source, converters,
+                    {'cache': cache, 'memoize': memoize,
+                     'record': record, 'keep_original': keep_original})
   return loaded
 
 def _ydump(v, newline=False):
   """
   This should really only be called with strings numbers.
   """
-  r = yaml.dump(v, default_flow_style=True,
-                   Dumper=yaml.dumper.SafeDumper)
+  import yaml
+  r = yaml.dump(v, default_flow_style=True, Dumper=_yaml_dumper())
   if r.endswith('\n...\n'):
     r = r[:-4]
   if not newline:
@@ -565,6 +1596,25 @@ def _ydump(v, newline=False):
       r = r[:-1]
   return r
 
+def _describe_choices(choices):
+  """
+  Describes the `choices` of a converter for :func:`sample_config`,
+  listing at most :data:`MAX_CHOICES_SHOWN` of them.
+  """
+  if len(choices) <= MAX_CHOICES_SHOWN:
+    return "One of: " + ", ".join([str(_c) for _c in choices])
+  shown = []
+  for _c in choices:
+    if len(shown) == MAX_CHOICES_SHOWN:
+      break
+    shown.append(str(_c))
+  source = getattr(choices, "source", None)
+  if source is None:
+    tmplt = "One of %d choices, e.g.: %s, ..."
+    return tmplt % (len(choices), ", ".join(shown))
+  tmplt = "One of the %d choices listed in %s, e.g.: %s, ..."
+  return tmplt % (len(choices), source, ", ".join(shown))
+
 def sample_config(schema):
   """
   Creates a sample config specification (returned as a :class:`str`)
@@ -608,36 +1658,247 @@ def sample_config(schema):
     <BLANKLINE>
     cell dimensions : [200, 200, 200]
   """
-  rstr = ["%YAML 1.2", "---"]
-  last = len(schema) - 1
-  was_help = True 
-  for i, (key, value) in enumerate(schema.items()):
-    if len(value) == 3:
-      c, example, help_ = value
-      d = Undefined
-    else:
-      c, example, help_, default = value
+  chunks = _Chunks()
+  write_sample_config(schema, chunks)
+  return "".join(chunks)
+
+class _Chunks(list):
+  """
+  A file-like :class:`list` of the chunks written to it.
+  """
+  write = list.append
+
+"""
+Strings that _ydump would write as they are: a letter, then
+letters, digits, spaces, and a few safe punctuation marks,
+not ending with a space.
+"""
+_PLAIN_STR = re.compile(r"[A-Za-z][-A-Za-z0-9_ ./]*\Z")
+
+"""
+Words that YAML reads as something other than a string.
+"""
+_YAML_WORDS = frozenset(["y", "Y", "yes", "Yes", "YES", "n", "N", "no",
+                         "No", "NO", "true", "True", "TRUE", "false",
+                         "False", "FALSE", "on", "On", "ON", "off", "Off",
+                         "OFF", "null", "Null", "NULL"])
+
+def _fast_ydump(v):
+  """
+  Returns what :func:`_ydump` returns for `v`, without calling
+  the YAML dumper for the simple scalars (and flat lists of them)
+  whose YAML is known in advance.
+  """
+  t = type(v)
+  if t is str:
+    if (len(v) <= 70 and not v.endswith(" ") and
+        v not in _YAML_WORDS and _PLAIN_STR.match(v)):
+      return v
+  elif t is int or t is long:
+    return str(v)
+  elif t is bool:
+    return "true" if v else "false"
+  elif v is None:
+    return "null"
+  elif t is list:
+    items = [_fast_ydump(i) if type(i) in (int, long, bool) else None
+             for i in v]
+    if None not in items:
+      r = "[" + ", ".join(items) + "]"
+      if len(r) <= 70:
+        return r
+  return _ydump(v)
+
+def write_sample_config(schema, fileobj):
+  """
+  Writes the sample config that :func:`sample_config` returns for
+  the `schema` to `fileobj` (e.g. :data:`sys.stdout` or a file),
+  one entry at a time, so the sample config for a very large
+  schema is never held in memory.
+
+  Args:
+    `schema`: a :class:`Schema`
+
+    `fileobj`: a file-like object with a ``write`` method
+
+  .. doctest::
+
+    >>> with open('template.yml', 'w') as f:
+    ...   phyles.write_sample_config(schema, f)
+  """
+  write = fileobj.write
+  write("%YAML 1.2\n---")
+  # one wrapper for all of the help strings
+  wrapper = textwrap.TextWrapper(initial_indent="# ",
+                                 subsequent_indent="# ")
+  was_help = True
+  for i, (key, value) in enumerate(schema.iteritems()):
+    c, example, help_ = value[:3]
     if was_help:
-      rstr.append("")
+      write("\n")
     if help_ is not None:
       if (not was_help) and (i > 0):
-        rstr.append("")
-      wrapper = textwrap.TextWrapper(initial_indent="# ",
-                                     subsequent_indent="# ")
-      rstr.append(wrapper.fill(help_))
+        write("\n")
+      write("\n" + wrapper.fill(help_))
       if hasattr(c, "choices"):
-        choices = "One of: " + ", ".join([str(_c) for _c in c.choices])
-        rstr.append(wrapper.fill(choices))
-      key = _ydump(key)
-      example = _ydump(example)
-      rstr.append('%s : %s' % (key, example))
+        write("\n" + wrapper.fill(_describe_choices(c.choices)))
+      write('\n%s : %s' % (_fast_ydump(key), _fast_ydump(example)))
       was_help = True
     else:
-      rstr.append('%s : %s' % (key, example))
+      write('\n%s : %s' % (key, example))
       was_help = False
-  return "\n".join(rstr)
 
-def validate_config(schema, config):
+def _compile_validator(schema, wrap=None):
+  """
+  Returns a function that validates a config against `schema`,
+  as described in :func:`validate_config`. If the function is
+  also given a :class:`list` for `errors`, then instead of
+  raising a :class:`ConfigError` at the first problem, it appends
+  a (key, message) :class:`tuple` to `errors` for every problem.
+  The ``lazy`` attribute of the function is its counterpart for
+  lazy validation (see :class:`LazyConfiguration`). If the schema
+  was loaded with ``record=True``, then the function makes
+  a :class:`ConfigRecord` instead of a :class:`Configuration`.
+
+  Everything that does not depend on the config is resolved
+  here, once per schema: the set of allowed keys, and for
+  each key its converter and its default (``Undefined`` if the
+  key is required). Validating a config then costs two passes
+  over the config (one to catch unknown entries, and one to
+  convert) and, only if entries are missing, a pass over the
+  steps to fill in the defaults.
+
+  If `wrap` is given, then each converter is replaced by
+  ``wrap(key, converter)`` (see :class:`ConverterProfile`).
+
+  .. note:: The steps are kept in a tuple rather than being
+            generated as python source: compiling generated
+            source costs far more per key than it saves and
+            does not scale to very large schemata.
+  """
+  allowed = frozenset(schema)
+  steps = []
+  for k, v in schema.iteritems():
+    if not (3 <= len(v) <= 4):
+      msg = "Item '%s' of specification is not valid." % k
+      raise ConfigError(msg)
+    if len(v) == 3:
+      default = Undefined
+    else:
+      default = v[3]
+    converter = v[0]
+    if wrap is not None:
+      converter = wrap(k, converter)
+    steps.append((k, converter, default))
+  steps = tuple(steps)
+  converters = dict((k, converter) for (k, converter, _) in steps)
+  n_steps = len(steps)
+  insert = OrderedDict.__setitem__
+  def _validator(config, errors=None):
+    if not hasattr(config, "keys"):
+      _bad_config(config, "not a mapping")
+    n_unknown = 0
+    for k in config:
+      if k not in allowed:
+        msg = "Unknown setting: '%s'" % k
+        if errors is None:
+          raise ConfigError(msg)
+        errors.append((k, msg))
+        n_unknown += 1
+    # the config is not copied: converted values are put straight
+    # into an empty Configuration, keeping the order of the config
+    validated = Configuration()
+    validated._source = config
+    for k in config:
+      converter = converters.get(k)
+      if converter is None:
+        continue
+      try:
+        insert(validated, k, converter(config[k]))
+      except (ValueError, TypeError, KeyError) as e:
+        if errors is None:
+          raise ConfigError(str(e))
+        errors.append((k, str(e)))
+      except ConfigError as e:
+        if errors is None:
+          raise
+        errors.append((k, str(e)))
+    if len(config) - n_unknown == n_steps:
+      return validated
+    # then the missing entries, in the order of the schema
+    for k, converter, default in steps:
+      if k in config:
+        continue
+      try:
+        if default is Undefined:
+          msg = "Settings file must specify a value for '%s'." % k
+          raise ConfigError(msg)
+        insert(validated, k, converter(default))
+      except (ValueError, TypeError, KeyError) as e:
+        if errors is None:
+          raise ConfigError(str(e))
+        errors.append((k, str(e)))
+      except ConfigError as e:
+        if errors is None:
+          raise
+        errors.append((k, str(e)))
+    return validated
+  def _lazy(config):
+    validated = LazyConfiguration(config)
+    for k in config:
+      if k not in allowed:
+        msg = "Unknown setting: '%s'" % k
+        raise ConfigError(msg)
+    pending = validated._pending
+    for k, converter, default in steps:
+      if k not in config:
+        if default is Undefined:
+          msg = "Settings file must specify a value for '%s'." % k
+          raise ConfigError(msg)
+        validated[k] = default
+      pending[k] = converter
+    return validated
+  _validator.lazy = _lazy
+  records = getattr(schema, "_records", None)
+  if records is None:
+    return _validator
+  make_record = schema._record_type
+  keep_original = records['keep_original']
+  def _record_validator(config, errors=None):
+    for k in config:
+      if k not in allowed:
+        msg = "Unknown setting: '%s'" % k
+        if errors is None:
+          raise ConfigError(msg)
+        errors.append((k, msg))
+    values = []
+    append = values.append
+    for k, converter, default in steps:
+      try:
+        if k in config:
+          append(converter(config[k]))
+        elif default is Undefined:
+          msg = "Settings file must specify a value for '%s'." % k
+          raise ConfigError(msg)
+        else:
+          append(converter(default))
+      except (ValueError, TypeError, KeyError) as e:
+        if errors is None:
+          raise ConfigError(str(e))
+        errors.append((k, str(e)))
+        append(None)
+      except ConfigError as e:
+        if errors is None:
+          raise
+        errors.append((k, str(e)))
+        append(None)
+    if keep_original:
+      return make_record(values, OrderedDict(config))
+    return make_record(values)
+  _record_validator.lazy = _lazy
+  return _record_validator
+
+def validate_config(schema, config, lazy=False):
   """
   Takes a YAML specification for a configuration, `config`,
   and uses the `schema` (as described in
@@ -678,9 +1939,16 @@ def validate_config(schema, config):
        of configuration entries
     `schema`:
        a :class:`Schema` as described in :func:`load_schema`
+    `lazy`:
+       if ``True``, then the config is checked for missing and
+       unknown entries as usual, but each value is converted only
+       when it is first read, which saves time if converters are
+       expensive and only some values are used (see
+       :class:`LazyConfiguration`)
 
   Returns:
-    The converted config as a :class:`Configuration`.
+    The converted config as a :class:`Configuration`
+    (a :class:`LazyConfiguration` if `lazy` is ``True``).
 
   Raises:
     :class:`ConfigError`
@@ -722,46 +1990,547 @@ def validate_config(schema, config):
                    ('reset b-facs', 20.0),
                    ('cell dimensions', [59.0, 95.0, 159.0])])
 
-  .. _`YAML str`: http://yaml.org/type/str.html
+  .. _`YAML str`: http://yaml.org/type/str.html
+  """
+  validator = _validator_for(schema)
+  if lazy:
+    validator = validator.lazy
+  return validator(config)
+
+def _validator_for(schema):
+  if _profile is not None:
+    return _profile.validator_for(schema)
+  try:
+    validator = schema._validator
+  except AttributeError:
+    if isinstance(schema, Schema):
+      validator = schema.compile()
+    else:
+      validator = _compile_validator(schema)
+  return validator
+
+class ConverterStats(object):
+  """
+  The number of `calls` of a converter, the number of them
+  that were `failures` (i.e. raised an exception), and the
+  `total` and `max` wall time of the calls in seconds.
+  """
+  __slots__ = ("calls", "failures", "total", "max")
+  def __init__(self):
+    self.reset()
+  def reset(self):
+    self.calls = self.failures = 0
+    self.total = self.max = 0.0
+  def __repr__(self):
+    tmplt = "ConverterStats(calls=%d, failures=%d, total=%r, max=%r)"
+    return tmplt % (self.calls, self.failures, self.total, self.max)
+
+class ConverterProfile(object):
+  """
+  Collects :class:`ConverterStats` for the converters run
+  by validation (:func:`validate_config`, :func:`validate_many`,
+  :func:`read_config`, :func:`revalidate`, etc.) while profiling
+  is on (see :func:`enable_profiling`).
+
+  When profiling is off, validation runs just as it would
+  without profiling. When it is on, each schema gets a second
+  validator, whose converters are timed, so the profile
+  sees every conversion, including those of a
+  :class:`LazyConfiguration` made while profiling was on.
+
+  Attributes:
+    `keys`: an :class:`OrderedDict` of :class:`ConverterStats` by
+            schema key (keys of different schemata with the same
+            name are counted together)
+
+    `converters`: an :class:`OrderedDict` of :class:`ConverterStats`
+                  by converter name, as given in the spec
+                  (e.g. ``'float'`` or ``'<int>'``), with
+                  ``'(mapping)'`` and ``'(choices)'`` for mappings
+                  and sequences of choices
+  """
+  def __init__(self):
+    self.keys = OrderedDict()
+    self.converters = OrderedDict()
+  def validator_for(self, schema):
+    """
+    Returns the timed validator for `schema`, compiling
+    it the first time.
+    """
+    profiled = getattr(schema, "_profiled", None)
+    if profiled is not None and profiled[0] is self:
+      return profiled[1]
+    names = getattr(schema, "_names", {})
+    def _wrap(key, converter):
+      return self.wrap(key, names.get(key), converter)
+    validator = _compile_validator(schema, _wrap)
+    try:
+      schema._profiled = (self, validator)
+    except AttributeError:
+      pass
+    return validator
+  def wrap(self, key, name, converter):
+    """
+    Returns `converter` wrapped so that its calls are counted
+    and timed under `key` and `name` (the name of the converter
+    itself if `name` is ``None``).
+    """
+    if name is None:
+      name = getattr(converter, "__name__", type(converter).__name__)
+    by_key = self.keys.setdefault(key, ConverterStats())
+    by_name = self.converters.setdefault(name, ConverterStats())
+    clock = time.time
+    def _timed(value):
+      start = clock()
+      try:
+        return converter(value)
+      except Exception:
+        by_key.failures += 1
+        by_name.failures += 1
+        raise
+      finally:
+        elapsed = clock() - start
+        for stats in (by_key, by_name):
+          stats.calls += 1
+          stats.total += elapsed
+          if elapsed > stats.max:
+            stats.max = elapsed
+    if hasattr(converter, "choices"):
+      _timed.choices = converter.choices
+    return _timed
+  def reset(self):
+    """
+    Sets all of the statistics back to zero.
+    """
+    for stats in self.keys.values() + self.converters.values():
+      stats.reset()
+  def report(self, stream=None):
+    """
+    Writes tables of the statistics by converter and by key,
+    slowest first, to `stream` (default :data:`sys.stderr`).
+    """
+    if stream is None:
+      stream = sys.stderr
+    header = "%-30s %9s %8s %11s %11s %11s\n"
+    row = "%-30s %9d %8d %11.3f %11.3f %11.3f\n"
+    for title, table in (("converter", self.converters),
+                         ("key", self.keys)):
+      stream.write(header % (title, "calls", "failed", "total ms",
+                             "mean ms", "max ms"))
+      by_total = sorted(table.items(), key=lambda item: -item[1].total)
+      for name, stats in by_total:
+        if stats.calls == 0:
+          continue
+        mean = stats.total / stats.calls
+        stream.write(row % (_abbrev(name, 30), stats.calls,
+                            stats.failures, stats.total * 1e3,
+                            mean * 1e3, stats.max * 1e3))
+      stream.write("\n")
+
+"""
+The ConverterProfile collecting statistics, or None if
+profiling is off (see enable_profiling).
+"""
+_profile = None
+_report_at_exit = []
+
+def enable_profiling(report_at_exit=False):
+  """
+  Turns on profiling of converters (see :class:`ConverterProfile`)
+  and returns the profile, which is kept if profiling was
+  already on.
+
+  Args:
+    `report_at_exit`: if ``True``, the report of the profile
+                      (see :meth:`ConverterProfile.report`) is
+                      written to :data:`sys.stderr` when the
+                      program exits
+
+  .. doctest::
+
+    >>> profile = phyles.enable_profiling()
+    >>> config = phyles.read_config(schema, 'config.yml')
+    >>> profile.converters['float'].calls
+    2
+    >>> profile.report()
+  """
+  global _profile
+  if _profile is None:
+    _profile = ConverterProfile()
+  if report_at_exit and not _report_at_exit:
+    import atexit
+    atexit.register(_report_profile)
+    _report_at_exit.append(True)
+  return _profile
+
+def disable_profiling():
+  """
+  Turns off profiling of converters and returns
+  the profile, or ``None`` if profiling was off.
+  """
+  global _profile
+  profile, _profile = _profile, None
+  return profile
+
+def _report_profile():
+  if _profile is not None:
+    _profile.report()
+
+def validate_many(schema, configs):
+  """
+  Lazily validates each config in the iterable `configs`
+  with the `schema`, as described in :func:`validate_config`.
+  Unlike :func:`validate_config`, a bad config does not stop
+  the validation. Instead, every problem with the config is
+  reported.
+
+  Because the configs are consumed and the results produced one
+  at a time, memory use does not depend on the number of configs
+  (e.g. `configs` can be a generator reading from a database).
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `configs`: an iterable of mappings (e.g. :class:`dict`)
+
+  Returns:
+    A generator of (index, result) :class:`tuples`, where index
+    is the position of the config in `configs` and result is
+    either the converted config as a :class:`Configuration` or,
+    if the config is not valid, a :class:`ConfigErrors`
+    holding all of its problems.
+
+  .. doctest::
+
+    >>> for i, result in schema.validate_many(configs):
+    ...   if isinstance(result, phyles.ConfigErrors):
+    ...     for key, msg in result.errors:
+    ...       print "config %s, key %s: %s" % (i, key, msg)
+    ...   else:
+    ...     process(result)
+  """
+  validator = _validator_for(schema)
+  for i, config in enumerate(configs):
+    if not hasattr(config, 'keys'):
+      msg = "Configuration is not a mapping: %s" % (repr(config),)
+      yield i, ConfigErrors([(None, msg)])
+      continue
+    errors = []
+    validated = validator(config, errors)
+    if errors:
+      yield i, ConfigErrors(errors)
+    else:
+      yield i, validated
+
+class _Overlay(object):
+  """
+  The unconverted values of a config, `base`, updated with
+  `changed`, which :func:`revalidate` uses to make the
+  `original` of a new config only if it is read.
+  """
+  __slots__ = ("base", "changed")
+  def __init__(self, base, changed):
+    if isinstance(base, _Overlay):
+      merged = OrderedDict(base.changed)
+      merged.update(changed)
+      base, changed = base.base, merged
+    else:
+      changed = OrderedDict(changed)
+    self.base = {} if base is None else base
+    self.changed = changed
+  def keys(self):
+    keys = list(self.base)
+    keys.extend(k for k in self.changed if k not in self.base)
+    return keys
+  def __getitem__(self, key):
+    if key in self.changed:
+      return self.changed[key]
+    return self.base[key]
+  def __reduce__(self):
+    return (_Overlay, (self.base, self.changed))
+
+def revalidate(schema, config, changed, inplace=False):
+  """
+  Returns a config made from the validated `config` with
+  the entries in the mapping `changed` set to new values, which
+  are validated with the `schema` like :func:`validate_config`
+  would. Only the converters for the changed entries are run,
+  so the cost of a change does not depend on the number or cost
+  of the other converters.
+
+  The `original` attribute of the returned config is that of
+  `config`, updated with the unconverted values of `changed`.
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `config`: a :class:`Configuration`, :class:`LazyConfiguration`,
+              or :class:`ConfigRecord` validated with `schema`
+
+    `changed`: a mapping (e.g. :class:`dict`) of the new, unconverted
+               values, keyed by the schema keys
+
+    `inplace`: if ``True``, then `config` itself is updated and
+               returned, and nothing is copied, so the cost
+               depends only on the number of changed entries;
+               otherwise, `config` is left as it is and a new
+               config is returned
+
+  Returns:
+    The config, of the same type as `config`.
+
+  Raises:
+    :class:`ConfigError` if an entry in `changed` is not in the
+    schema or fails to convert, in which case `config` is
+    not changed
+
+  .. doctest::
+
+    >>> config = schema.validate_config(cfg)
+    >>> config['reset b-facs']
+    20.0
+    >>> config = schema.revalidate(config, {'reset b-facs': 30})
+    >>> config['reset b-facs'], config.original['reset b-facs']
+    (30.0, 30)
   """
-  validated = Configuration(config)
-  for k in config:
-    if k not in schema:
-      msg = "Unknown setting: '%s'" % k
-      raise ConfigError(msg)
-  for k, v in schema.items():
-    if len(v) == 3:
-      converter, example, help_ = v
-      default = Undefined
-    else:
-      converter, example, help_, default = v
-    value = config.get(k, default)
-    if value is Undefined:
-      msg = "Settings file must specify a value for '%s'." % k
-      raise ConfigError, msg
+  converted = []
+  for k in changed:
     try:
-      validated[k] = converter(value)
+      converter = schema[k][0]
+    except KeyError:
+      raise ConfigError("Unknown setting: '%s'" % k)
+    if _profile is not None:
+      name = getattr(schema, "_names", {}).get(k)
+      converter = _profile.wrap(k, name, converter)
+    try:
+      converted.append((k, converter(changed[k])))
     except (ValueError, TypeError, KeyError) as e:
       raise ConfigError(str(e))
-  return validated
+  if isinstance(config, ConfigRecord):
+    new = config if inplace else config.copy()
+    for k, value in converted:
+      new[k] = value
+    if config._original is not None:
+      if not inplace:
+        new._original = OrderedDict(config._original)
+      new._original.update(changed)
+    return new
+  if inplace:
+    for k, value in converted:
+      config[k] = value
+    config.original.update(changed)
+    return config
+  # copied below dict level, so values of a LazyConfiguration
+  # are neither converted nor taken from the pending ones
+  new = config.__class__()
+  insert = OrderedDict.__setitem__
+  raw = dict.__getitem__
+  for k in config:
+    insert(new, k, raw(config, k))
+  for k, value in converted:
+    insert(new, k, value)
+  if isinstance(config, LazyConfiguration):
+    new._pending = dict(config._pending)
+    for k in changed:
+      new._pending.pop(k, None)
+  if config._original is None:
+    new._source = _Overlay(config._source, changed)
+  else:
+    new._source = _Overlay(config._original, changed)
+  return new
+
+"""
+Config file formats by file name extension (see read_cfg).
+Pickle and marshal are never guessed from the content.
+"""
+CONFIG_FORMATS = {'.yml': 'yaml', '.yaml': 'yaml',
+                  '.json': 'json',
+                  '.msgpack': 'msgpack', '.mpk': 'msgpack',
+                  '.pickle': 'pickle', '.pkl': 'pickle',
+                  '.marshal': 'marshal'}
+
+"""
+JSON parsers, fastest first.
+"""
+_JSON_MODULES = ("ujson", "simplejson", "json")
+
+_json_loads = None
+
+def _jload(text):
+  """
+  Parses the JSON `text` with the fastest JSON parser
+  installed (see ``_JSON_MODULES``).
+  """
+  global _json_loads
+  if _json_loads is None:
+    import importlib
+    for name in _JSON_MODULES:
+      try:
+        _json_loads = importlib.import_module(name).loads
+      except ImportError:
+        continue
+      break
+  return _str_keys(_json_loads(text))
+
+def _str_keys(cfg):
+  """
+  Returns the mapping `cfg` with its ASCII :class:`unicode` keys
+  made :class:`str`, as YAML gives them, so configs read from
+  JSON and msgpack have the same keys as ones read from YAML.
+  """
+  if not isinstance(cfg, dict):
+    return cfg
+  keyed = {}
+  for k, v in cfg.iteritems():
+    if isinstance(k, unicode):
+      try:
+        k = k.encode("ascii")
+      except UnicodeError:
+        pass
+    keyed[k] = v
+  return keyed
+
+def _mload(data):
+  """
+  Parses the msgpack `data`.
+  """
+  try:
+    import msgpack
+  except ImportError:
+    raise ConfigError("Reading msgpack configs needs msgpack.")
+  return _str_keys(msgpack.unpackb(data))
+
+def _marshal_load(data):
+  import marshal
+  return marshal.loads(data)
+
+_cfg_loaders = {'yaml': _yload,
+                'json': _jload,
+                'msgpack': _mload,
+                'pickle': pickle.loads,
+                'marshal': _marshal_load}
+
+def _config_format(config_file, data):
+  """
+  Returns the format of the config `data` read from the file
+  named `config_file`: the format for its extension (see
+  ``CONFIG_FORMATS``) if it has one, else ``'json'`` or
+  ``'msgpack'`` if the data starts like a JSON object or a
+  msgpack map, else ``'yaml'``.
+  """
+  ext = os.path.splitext(config_file)[1].lower()
+  if ext in CONFIG_FORMATS:
+    return CONFIG_FORMATS[ext]
+  head = data[:1]
+  if "\x80" <= head <= "\x8f" or head in ("\xde", "\xdf"):
+    return 'msgpack'
+  text = data.lstrip()
+  if text[:1] == "{" and text[1:].lstrip()[:1] in ('"', '}'):
+    return 'json'
+  return 'yaml'
+
+def _parse_cfg(config_file, data):
+  """
+  Parses the `data` read from the file named `config_file` in
+  its format (see :func:`_config_format`). Data whose format
+  was only guessed from its content is parsed as YAML if it
+  does not parse in the guessed format.
+  """
+  fmt = _config_format(config_file, data)
+  if fmt == 'yaml':
+    return _yload(data)
+  try:
+    return _cfg_loaders[fmt](data)
+  except ConfigError:
+    raise
+  except Exception as e:
+    ext = os.path.splitext(config_file)[1].lower()
+    if ext not in CONFIG_FORMATS:
+      return _yload(data)
+    tmplt = 'Problem parsing settings file "%s" as %s: %s'
+    raise ConfigError(tmplt % (config_file, fmt, e))
+
+"""
+Parsed config files, keyed by absolute path, with the stat
+signature of the file when it was read (see read_cfg).
+"""
+_cfg_cache = _LRUCache(64)
+
+"""
+Seconds within which a file modified as it was read may be
+changed again without a change of modification time, so it
+is not cached.
+"""
+_CFG_CACHE_RACY = 1.0
 
 def read_cfg(config_file):
-  if not os.path.exists(config_file):
+  try:
+    st = os.stat(config_file)
+  except OSError:
     msg = 'Settings file "%s" does not exist.' % config_file
     raise ConfigError(msg)
+  if _cfg_cache.maxsize > 0:
+    key = os.path.abspath(config_file)
+    signature = (st.st_dev, st.st_ino, st.st_size,
+                 st.st_mtime, st.st_ctime)
+    cached = _cfg_cache.get(key, valid=lambda c: c[0] == signature)
+    if cached is not None:
+      return pickle.loads(cached[1])
   try:
     msg = 'Problem reading settings file "%s".' % config_file
-    with open(config_file) as f:
+    with open(config_file, "rb") as f:
       settings = f.read()
   except IOError:
     raise ConfigError(msg)
-  cfg = yaml.load(settings)
+  cfg = _parse_cfg(config_file, settings)
+  # a stale entry was already dropped by the lookup
+  if (_cfg_cache.maxsize > 0 and
+      time.time() - st.st_mtime > _CFG_CACHE_RACY):
+    # kept pickled: unpickling is much faster than deepcopy
+    try:
+      blob = pickle.dumps(cfg, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError):
+      pass
+    else:
+      _cfg_cache.put(key, (signature, blob))
   return cfg
 
+def config_cache_info():
+  """
+  Returns the statistics of the cache of parsed config files
+  used by :func:`read_config` and :func:`set_up`, as a named
+  :class:`tuple` with the fields ``hits``, ``misses``,
+  ``evictions``, ``maxsize``, and ``currsize``.
+
+  A config file is parsed again if its inode, size,
+  modification time, or change time differ from when it was
+  cached, so a changed file is always read again. A file
+  modified within a second of being read is not cached, because
+  it could change again without its modification time changing.
+  Each read gets its own copy of the parsed config, so changing
+  it does not change the cache.
+  """
+  return _cfg_cache.info()
+
+def clear_config_cache():
+  """
+  Empties the cache of parsed config files
+  (see :func:`config_cache_info`).
+  """
+  _cfg_cache.clear()
+
+def set_config_cache_size(maxsize):
+  """
+  Sets the number of config files kept in the cache of parsed
+  config files (see :func:`config_cache_info`) to `maxsize`,
+  forgetting the least recently used ones if needed. The
+  default is 64, and a `maxsize` of 0 turns off the cache.
+  """
+  _cfg_cache.resize(maxsize)
 
-def read_config(schema, config_file):
+def read_config(schema, config_file, lazy=False):
   """
-  Reads a YAML config file from the the file named
+  Reads a config file (YAML, or see below) from the file named
   `config_file` and returns the config validated
   by `schema`.
 
@@ -773,15 +2542,446 @@ def read_config(schema, config_file):
               reset b-facs : 20
               cell dimensions : [59, 95, 159]
 
+         Configs may also be JSON, msgpack, pickle, or marshal
+         files, which are quicker to parse, e.g. for configs
+         written by programs. The format is given by the file
+         name extension (``.yml``, ``.yaml``, ``.json``,
+         ``.msgpack``, ``.mpk``, ``.pickle``, ``.pkl``, or
+         ``.marshal``), or, for other names, JSON and msgpack
+         are recognized by their first bytes. JSON is parsed
+         with `ujson`_ or `simplejson`_ if installed, and
+         msgpack needs `msgpack`_. The keys of a JSON or msgpack
+         config are :class:`str`, as from YAML, but the
+         strings in its values (and the keys of mappings in its
+         values) may be :class:`unicode`, even when ASCII.
+         Pickle and marshal files can run code or crash python
+         when read, so they are read only if their names end
+         with ``.pickle``, ``.pkl``, or ``.marshal``, and
+         only files from trusted sources should have these names.
+
     `schema`: a :class:`Schema` as described in :func:`load_schema`
 
+    `lazy`: if ``True``, values are converted on first access,
+    as described in :func:`validate_config`
+
   Returns:
      a :class:`Configuration`
+
+  .. _`ujson`: https://pypi.org/project/ujson/
+  .. _`simplejson`: https://pypi.org/project/simplejson/
+  .. _`msgpack`: https://pypi.org/project/msgpack/
   """
   cfg = read_cfg(config_file)
-  return validate_config(schema, cfg)
+  return validate_config(schema, cfg, lazy=lazy)
+
+def read_configs(schema, config_file):
+  """
+  Reads a YAML stream holding many configs, one per YAML document,
+  and generates the configs validated by `schema`. Documents are
+  parsed one at a time, so memory use does not depend on the
+  number of configs in the stream. Empty documents are skipped.
+
+  Args:
+    `config_file`:
+         name of a YAML file or a file object, for example::
+
+              pdb model : model-1.pdb
+              reset b-facs : 20
+              cell dimensions : [59, 95, 159]
+              ---
+              pdb model : model-2.pdb
+              cell dimensions : [61, 95, 155]
+
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+  Returns:
+     a generator of :class:`Configuration` objects
+
+  Raises:
+    :class:`ConfigError` at the first config that isn't valid,
+    saying which document (counting from 1) holds it
+  """
+  if isinstance(config_file, basestring):
+    if not os.path.exists(config_file):
+      msg = 'Settings file "%s" does not exist.' % config_file
+      raise ConfigError(msg)
+    try:
+      f = open(config_file)
+    except IOError:
+      msg = 'Problem reading settings file "%s".' % config_file
+      raise ConfigError(msg)
+  else:
+    f = config_file
+  name = getattr(f, "name", "<stream>")
+  validator = _validator_for(schema)
+  try:
+    for i, cfg in enumerate(_yload_all(f)):
+      if cfg is None:
+        continue
+      try:
+        if not hasattr(cfg, 'keys'):
+          raise ConfigError("Configuration is not a mapping.")
+        yield validator(cfg)
+      except ConfigError as e:
+        msg = 'Document %d of "%s": %s' % (i + 1, name, e)
+        raise ConfigError(msg)
+  finally:
+    if f is not config_file:
+      f.close()
+
+def _digest_converter(h, converter, depth=0):
+  """
+  Updates the hash `h` with what identifies `converter` (or
+  any other value): its type or name, its :func:`repr` unless
+  that holds an address, and, for python functions, its code,
+  defaults, and the values it closes over.
+  """
+  if depth > 4:
+    return
+  if isinstance(converter, _MemoizedConverter):
+    converter = converter.converter
+  name = getattr(converter, "__name__", type(converter).__name__)
+  h.update("\0%s.%s" % (getattr(converter, "__module__", None), name))
+  code = getattr(converter, "func_code", None)
+  if code is None:
+    r = repr(converter)
+    # addresses differ from run to run
+    if " at 0x" not in r:
+      h.update(r)
+    return
+  codes = [code]
+  while codes:
+    code = codes.pop()
+    h.update(code.co_code)
+    for const in code.co_consts:
+      if hasattr(const, "co_code"):
+        codes.append(const)
+      else:
+        h.update(repr(const))
+  cells = [c.cell_contents for c in (converter.func_closure or ())]
+  for value in list(converter.func_defaults or ()) + cells:
+    _digest_converter(h, value, depth + 1)
+
+def schema_fingerprint(schema):
+  """
+  Returns a hex digest that identifies what validating with
+  `schema` does: its keys, converters, and defaults, with the
+  phyles version. Help strings and examples are left out.
+
+  Converters are identified by their names and code rather
+  than by identity, so loading the same specification in
+  another run gives the same fingerprint, and changing a
+  converter function gives a new one. A converter or default
+  whose :func:`repr` differs from run to run (e.g. an object
+  that shows its address) only adds its type to the fingerprint.
+
+  Args:
+    `schema`: a :class:`Schema`
+
+  Returns: a :class:`str`
+  """
+  fingerprint = getattr(schema, "_fingerprint", None)
+  if fingerprint is not None:
+    return fingerprint
+  h = hashlib.sha1(__version__)
+  h.update(repr(getattr(schema, "_records", None)))
+  for key, value in schema.iteritems():
+    h.update("\0" + repr(key))
+    _digest_converter(h, value[0])
+    if len(value) > 3:
+      _digest_converter(h, value[3])
+  fingerprint = h.hexdigest()
+  if isinstance(schema, Schema):
+    schema.__dict__['_fingerprint'] = fingerprint
+  return fingerprint
+
+def _snapshot_name(config_file, snapshot_file):
+  if snapshot_file is None:
+    snapshot_file = config_file + SNAPSHOT_SUFFIX
+  return snapshot_file
+
+def compile_config(schema, config_file, snapshot_file=None):
+  """
+  Reads and validates the config in the file `config_file`
+  (as :func:`read_config` does), and writes the validated
+  config to the snapshot file `snapshot_file`, from which
+  :func:`load_snapshot` (and :func:`set_up` with
+  ``snapshots=True``) can load it without parsing or converting
+  it again, for as long as neither the config file nor the
+  schema changes.
+
+  The snapshot starts with a stamp, one line of JSON holding
+  the fingerprint of the schema (see :func:`schema_fingerprint`)
+  and the SHA-1 digest, size, and modification time of the
+  config file, which is followed by the config as a pickle.
+  Unpickling can run code, so :func:`load_snapshot` checks the
+  stamp without unpickling anything, and only unpickles
+  snapshots owned by the user running the program.
+
+  This is also the ``phyles-compile-config`` command.
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `config_file`: the name of the config file
+
+    `snapshot_file`: the name of the snapshot file; the default
+    is the name of the config file followed by
+    :data:`SNAPSHOT_SUFFIX` (e.g. ``settings.yml.snapshot``)
+
+  Returns: the config as a :class:`Configuration`
+
+  .. doctest::
+
+    >>> config = phyles.compile_config(schema, 'settings.yml')
+    >>> phyles.load_snapshot(schema, 'settings.yml') == config
+    True
+  """
+  snapshot_file = _snapshot_name(config_file, snapshot_file)
+  try:
+    st = os.stat(config_file)
+    with open(config_file, "rb") as f:
+      data = f.read()
+  except (OSError, IOError):
+    msg = 'Problem reading settings file "%s".' % config_file
+    raise ConfigError(msg)
+  config = validate_config(schema, _parse_cfg(config_file, data))
+  mtime = st.st_mtime
+  if time.time() - mtime <= _CFG_CACHE_RACY:
+    # could change again with the same mtime, so always hash it
+    mtime = None
+  stamp = {'schema': schema_fingerprint(schema),
+           'sha1': hashlib.sha1(data).hexdigest(),
+           'size': st.st_size,
+           'mtime': mtime}
+  import json
+  tmp = "%s.%s.tmp" % (snapshot_file, os.getpid())
+  try:
+    with open(tmp, "wb") as f:
+      # the stamp comes first, so a stale config is never unpickled
+      f.write(json.dumps(stamp, sort_keys=True) + "\n")
+      pickle.dump(config, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, snapshot_file)
+  except (OSError, IOError, pickle.PicklingError, TypeError) as e:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    msg = 'Could not write snapshot "%s": %s' % (snapshot_file, e)
+    raise ConfigError(msg)
+  return config
+
+"""
+Most bytes read for the stamp line of a snapshot.
+"""
+_SNAPSHOT_STAMP_MAX = 4096
+
+def load_snapshot(schema, config_file, snapshot_file=None):
+  """
+  Returns the config in the snapshot of `config_file` written
+  by :func:`compile_config`, or ``None`` if there is no snapshot
+  or it is stale, i.e. if the schema or the config file changed
+  since it was written.
+
+  The config file is hashed only if its size or modification
+  time changed, so that a file that was touched or copied
+  without changing still has a fresh snapshot.
+
+  A snapshot that is not owned by the user running the program
+  is ignored, as is one whose stamp does not match, and in
+  neither case is its config unpickled.
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `config_file`: the name of the config file
+
+    `snapshot_file`: the name of the snapshot file, as
+    described in :func:`compile_config`
+
+  Returns: a :class:`Configuration` or ``None``
+  """
+  snapshot_file = _snapshot_name(config_file, snapshot_file)
+  try:
+    f = open(snapshot_file, "rb")
+  except IOError:
+    return None
+  try:
+    with f:
+      if (hasattr(os, "getuid") and
+          os.fstat(f.fileno()).st_uid != os.getuid()):
+        import logging
+        logging.warning("Ignoring snapshot '%s' owned by another user.",
+                        snapshot_file)
+        return None
+      import json
+      stamp = json.loads(f.readline(_SNAPSHOT_STAMP_MAX))
+      if stamp['schema'] != schema_fingerprint(schema):
+        return None
+      st = os.stat(config_file)
+      if (st.st_size, st.st_mtime) != (stamp['size'], stamp['mtime']):
+        with open(config_file, "rb") as g:
+          if hashlib.sha1(g.read()).hexdigest() != stamp['sha1']:
+            return None
+      return pickle.load(f)
+  except Exception as e:
+    import logging
+    logging.debug("Ignoring snapshot '%s': %s", snapshot_file, e)
+    return None
+
+def _converter_ref(converter):
+  """
+  Returns a ``'module:name'`` reference to the `converter`
+  that :func:`_resolve_ref` turns back into the `converter`.
+  References (i.e. strings) are returned unchanged.
+
+  Raises :class:`PhylesError` if the converter can't be found
+  by its name (e.g. lambdas and closures).
+  """
+  if isinstance(converter, basestring):
+    return converter
+  name = getattr(converter, '__name__', None)
+  module = getattr(converter, '__module__', None)
+  ref = "%s:%s" % (module, name)
+  try:
+    found = _resolve_ref(ref)
+  except (ImportError, AttributeError, ValueError):
+    found = None
+  if found is not converter:
+    tmplt = ("Converter %s can't be found by name. Converters for " +
+             "parallel reading must be defined at module level " +
+             "or given as 'module:name' references.")
+    raise PhylesError(tmplt % (repr(converter),))
+  return ref
+
+def _resolve_ref(ref):
+  """
+  Imports and returns the object named by `ref`, which has the
+  form ``'package.module:name'`` (``name`` may be dotted).
+  """
+  module, sep, name = ref.partition(":")
+  if not (sep and module and name):
+    raise ValueError("Not a 'module:name' reference: '%s'" % ref)
+  __import__(module)
+  obj = sys.modules[module]
+  for attr in name.split("."):
+    obj = getattr(obj, attr)
+  return obj
+
+def _config_paths(paths, suffix):
+  """
+  Generates the config file names for :func:`read_many`.
+  """
+  if isinstance(paths, basestring):
+    if isinstance(suffix, basestring):
+      suffix = (suffix,)
+    for apath, dirs, files in os.walk(paths):
+      dirs.sort()
+      for fn in sorted(files):
+        if (suffix is None) or fn.endswith(tuple(suffix)):
+          yield os.path.join(apath, fn)
+  else:
+    for path in paths:
+      yield path
+
+"""
+Schema of a worker process (see read_many).
+"""
+_worker_schema = None
+
+def _init_worker(spec, refs, options):
+  global _worker_schema
+  converters = None
+  if refs is not None:
+    converters = dict((k, _resolve_ref(r)) for (k, r) in refs.items())
+  _worker_schema = load_schema(spec, converters, **options)
+
+def _read_one(path, schema=None):
+  """
+  Reads and validates the config in the file `path`, returning
+  a (path, result) :class:`tuple` as described in :func:`read_many`.
+  """
+  import yaml
+  if schema is None:
+    schema = _worker_schema
+  try:
+    cfg = read_cfg(path)
+  except (ConfigError, yaml.YAMLError) as e:
+    return path, ConfigErrors([(None, str(e))])
+  result = validate_many(schema, [cfg]).next()[1]
+  return path, result
+
+def read_many(schema, paths, processes=None, chunksize=None,
+                             suffix=('.yml', '.yaml')):
+  """
+  Reads and validates many config files with `schema`, using a
+  pool of `processes` worker processes. Each config is read
+  and validated as with :func:`read_config`, except that, as with
+  :func:`validate_many`, problems with a config do not stop
+  the reading of the others.
+
+  Each worker builds its own copy of the `schema` from the
+  specification and converters that were given to
+  :func:`load_schema`, so :func:`load_schema` must have been used
+  to make the `schema`. The converters are sent to the workers by
+  name, so they must be defined at the top level of a module
+  (i.e. not lambdas or closures), or be given to
+  :func:`load_schema` as references of the form
+  ``'package.module:name'``.
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `paths`: a sequence of config file names or the name of a
+    directory, in which case config files are found recursively
+    and read in sorted order
+
+    `processes`: the number of worker processes; defaults to the
+    number of CPUs; if ``1``, no workers are started and the files
+    are read in the current process
+
+    `chunksize`: the number of files handed to a worker at a time;
+    by default, chosen from the number of files and processes
+
+    `suffix`: if `paths` is a directory, only file names ending
+    with `suffix` (a :class:`str` or a sequence of them) are read;
+    ``None`` reads all files
+
+  Returns:
+    A generator of (path, result) :class:`tuples` in the order
+    of `paths`, where result is the :class:`Configuration` or a
+    :class:`ConfigErrors`, as described in :func:`validate_many`.
+  """
+  paths = _config_paths(paths, suffix)
+  if processes == 1:
+    for path in paths:
+      yield _read_one(path, schema)
+    return
+  import multiprocessing
+  try:
+    spec, converters, options = schema._source
+  except AttributeError:
+    msg = "Parallel reading needs a schema made by load_schema()."
+    raise PhylesError(msg)
+  if converters is None:
+    refs = None
+  else:
+    refs = dict((k, _converter_ref(c)) for (k, c) in converters.items())
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  paths = list(paths)
+  if chunksize is None:
+    chunksize = max(1, min(64, len(paths) // (processes * 4)))
+  pool = multiprocessing.Pool(processes, _init_worker,
+                              (spec, refs, options))
+  try:
+    for result in pool.imap(_read_one, paths, chunksize):
+      yield result
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
 
 def _last_made_helper(dirpath, suffix):
+  from stat import S_ISREG, ST_CTIME, ST_MODE
   # get all entries in the directory w/ stats
   entries = [os.path.join(dirpath, fn) for fn in os.listdir(dirpath)]
   entries = [(os.stat(path), path) for path in entries]
@@ -848,6 +3048,7 @@ def wait_exec(cmd, instr=None):
   funciton is somewhat redundant with pyhon's
   :func:`subprocess.call`.
   """
+  import subprocess
   handle = subprocess.Popen(cmd,
                             stdin=subprocess.PIPE,
                             stdout=subprocess.PIPE,
@@ -995,12 +3196,15 @@ def get_home_dir():
                     homeDir = 'C:\\'
     return homeDir
 
-def basic_logger(name, level=logging.INFO):
+def basic_logger(name, level=None):
   """
   Returns an instance of :class:`logging.Logger` named `name` with
-  level of `level` (defaults to `logging.INFO`). The format of the
-  messages is "%(levelname)s: %(message)s".
+  level of `level` (``None`` for `logging.INFO`, the default). The
+  format of the messages is "%(levelname)s: %(message)s".
   """
+  import logging
+  if level is None:
+    level = logging.INFO
   logger = logging.getLogger(name)
   logger.setLevel(level)
   ch = logging.StreamHandler()
@@ -1010,7 +3214,13 @@ def basic_logger(name, level=logging.INFO):
   logger.addHandler(ch)
   return logger
 
-def get_data_path(env_var, package_name, data_dir):
+"""
+Results of get_data_path, keyed by (package_name, data_dir),
+as (path, None) or, for failures, (None, exception).
+"""
+_data_paths = {}
+
+def get_data_path(env_var, package_name, data_dir, cache=None):
   """
   Returns the path to the data directory. First
   it looks for the directory specified in the
@@ -1067,6 +3277,22 @@ def get_data_path(env_var, package_name, data_dir):
 
           pth = get_data_path(Undefined, 'my_package', 'package-data')
 
+  Finding the package and probing these places is done only
+  once per process for each `package_name` and `data_dir`:
+  the result, including failure, is remembered (see
+  :func:`clear_data_path_cache`). The path in `env_var`
+  is always checked afresh.
+
+  Args:
+    `cache`: if caching is on (as described for the `cache`
+             argument of :func:`load_schema`), then paths
+             found are also remembered between processes in the
+             cache directory, until the package is moved or its
+             directory changes (e.g. on reinstall); this is best
+             effort: if processes find paths at the same time,
+             some paths may not be remembered and are found
+             again later
+
   .. _`matplotlib license`:
      http://matplotlib.sourceforge.net/users/license.html
   .. _`__package__`: http://www.python.org/dev/peps/pep-0366/
@@ -1081,6 +3307,136 @@ def get_data_path(env_var, package_name, data_dir):
       msg = tmplt % env_var
       raise RuntimeError(msg)
 
+  key = (package_name, data_dir)
+  try:
+    path, error = _data_paths[key]
+  except KeyError:
+    pass
+  else:
+    if error is not None:
+      raise type(error)(*error.args)
+    return path
+
+  dirpath = _cache_dir(cache)
+  if dirpath is not None:
+    path = _cached_data_path(dirpath, key)
+    if path is not None:
+      _data_paths[key] = (path, None)
+      return path
+
+  try:
+    path = _find_data_path(package_name, data_dir)
+  except (RuntimeError, ImportError) as e:
+    _data_paths[key] = (None, e)
+    raise
+  _data_paths[key] = (path, None)
+  if dirpath is not None:
+    _cache_data_path(dirpath, key, path)
+  return path
+
+def clear_data_path_cache():
+  """
+  Forgets the data paths found by :func:`get_data_path` in
+  this process, so that each is looked for again.
+  """
+  _data_paths.clear()
+
+def _package_stamp(package_name):
+  """
+  Returns the directory of the imported package `package_name`
+  and its modification time, or ``None`` if the package has not
+  been imported.
+  """
+  module = sys.modules.get(package_name)
+  filename = getattr(module, "__file__", None)
+  if filename is None:
+    return None
+  location = os.path.dirname(os.path.abspath(filename))
+  try:
+    return (location, os.stat(location).st_mtime)
+  except OSError:
+    return None
+
+"""
+File in the cache directory of the data paths found by
+get_data_path, as JSON so that reading it can't run code.
+"""
+_DATA_PATHS_FILE = "data-paths.json"
+
+def _data_path_entry(key):
+  return "%s:%s" % key
+
+def _read_data_paths(filepath):
+  """
+  Returns the data paths cached in the file `filepath`
+  as a :class:`dict`, which is empty if the file is missing
+  or bad.
+  """
+  import json
+  try:
+    with open(filepath, "rb") as f:
+      cached = json.load(f)
+  except (IOError, ValueError):
+    return {}
+  if not isinstance(cached, dict):
+    return {}
+  return cached
+
+def _cached_data_path(dirpath, key):
+  """
+  Returns the data path for `key` cached on disk in `dirpath`
+  (see :func:`get_data_path`), or ``None`` if there is none or
+  if it is out of date.
+  """
+  stamp = _package_stamp(key[0])
+  if stamp is None:
+    return None
+  cached = _read_data_paths(os.path.join(dirpath, _DATA_PATHS_FILE))
+  try:
+    location, mtime, path = cached[_data_path_entry(key)]
+    # JSON gives unicode, but paths are str elsewhere
+    encoding = sys.getfilesystemencoding() or "utf-8"
+    location = location.encode(encoding)
+    path = path.encode(encoding)
+  except (KeyError, TypeError, ValueError, AttributeError):
+    return None
+  if (location, mtime) == stamp and os.path.isdir(path):
+    return path
+  return None
+
+def _cache_data_path(dirpath, key, path):
+  """
+  Adds the data `path` for `key` to the cache on disk in `dirpath`.
+
+  This is best effort: the file is read, updated, and replaced
+  without a lock, so if processes add paths at the same time,
+  the paths added by all but one of them are lost (and are
+  found again when next needed).
+  """
+  stamp = _package_stamp(key[0])
+  if stamp is None:
+    return
+  import json
+  filepath = os.path.join(dirpath, _DATA_PATHS_FILE)
+  cached = _read_data_paths(filepath)
+  cached[_data_path_entry(key)] = list(stamp) + [path]
+  try:
+    if not os.path.isdir(dirpath):
+      os.makedirs(dirpath, 0700)
+    tmp = "%s.%s.tmp" % (filepath, os.getpid())
+    with open(tmp, "wb") as f:
+      json.dump(cached, f)
+    os.rename(tmp, filepath)
+  except (OSError, IOError, TypeError, ValueError) as e:
+    import logging
+    logging.debug("Could not write data path cache '%s': %s",
+                  filepath, e)
+
+def _find_data_path(package_name, data_dir):
+  """
+  Probes for `data_dir` as described in :func:`get_data_path`.
+  """
+  import modulefinder
   finder = modulefinder.ModuleFinder()
   node = finder.find_module(package_name, None)[1]
   if os.path.isdir(node):
@@ -1118,6 +3474,7 @@ def format_config_dict(config, first_space=None):
   leading space.
   """
   config = dict(config)
+  import pprint
   pp = pprint.PrettyPrinter(indent=2)
   f = " " + pp.pformat(config)[1:-1]
   f = f.replace(r"\n'", "'")
@@ -1133,7 +3490,11 @@ def default_argparser():
   mutually exclusive template (``-t``, ``--template``)
   and config (``-c``, ``--config``) arguments added. It
   also has the override (``-o``, ``--override``) option
-  added, to override configuration items on the command line.
+  added, to override configuration items on the command line,
+  the ``--profile-converters`` option, which reports the
+  time taken by each converter when the program exits (see
+  :func:`enable_profiling`), and the ``--timings`` option, which
+  reports the time taken by each phase of :func:`set_up`.
 
   The argument to ``--override`` should be a valid `YAML map`_
   (with the **single** exception that the outermost curly braces
@@ -1180,6 +3541,7 @@ def default_argparser():
   .. _`YAML flow style`: http://yaml.org/spec/current.html#id2544175
   .. _`YAML block style`: http://yaml.org/spec/current.html#id2545757
   """
+  import argparse
   parser = argparse.ArgumentParser()
 
   group = parser.add_mutually_exclusive_group(required=True)
@@ -1197,6 +3559,15 @@ def default_argparser():
                       help="override settings in config file",
                       metavar="OVERRIDE_SETTINGS", dest="override")
 
+  parser.add_argument("--profile-converters", action="store_true",
+                      default=False,
+                      help="report the time taken by each converter",
+                      dest="profile_converters")
+
+  parser.add_argument("--timings", action="store_true", default=False,
+                      help="report the time taken to start up",
+                      dest="timings")
+
   return parser
 
 def parse_override(override):
@@ -1205,12 +3576,12 @@ def parse_override(override):
   config file settings.
   """
   y = override.decode('string_escape')
-  cfg = yaml.load(y)
+  cfg = _yload(y)
   try:
     {}.update(cfg)
   except:
     y = "{" + y + "}"
-    cfg = yaml.load(y)
+    cfg = _yload(y)
     try:
       {}.update(cfg)
     except:
@@ -1252,7 +3623,36 @@ def _schema_error(e):
          "the program author.\n") % (e,)
   graceful(msg)
 
-def set_up(program, version, spec, converters=None, argparser=None):
+"""
+Seconds taken by the import of the phyles package,
+set at the end of the import.
+"""
+_import_seconds = None
+
+class _PhaseTimer(object):
+  """
+  Times the phases of a process (see :func:`set_up`), each
+  phase ending when the next one is marked.
+  """
+  def __init__(self):
+    self.phases = OrderedDict()
+    self.last = time.time()
+  def mark(self, phase):
+    now = time.time()
+    self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+    self.last = now
+  def report(self, stream=None):
+    if stream is None:
+      stream = sys.stderr
+    stream.write("Startup timings (ms):\n")
+    for phase, seconds in self.phases.items():
+      stream.write("  %-20s %10.1f\n" % (phase, seconds * 1e3))
+    total = sum(self.phases.values())
+    stream.write("  %-20s %10.1f\n" % ("total", total * 1e3))
+
+def set_up(program, version, spec, converters=None, argparser=None,
+                                   lazy=False, profile=False,
+                                   timings=False, snapshots=False):
   """
   Given the name of the program (`program`), the `version`
   string, the specification for the schema (`spec`;
@@ -1268,7 +3668,9 @@ def set_up(program, version, spec, converters=None, argparser=None):
        :func:`template` and :func:`banner`)
 
     3. creates a schema and uses it to validate the config
-       (see :func:`load_config` and :func:`validate_config`)
+       (see :func:`load_config` and :func:`validate_config`),
+       or loads the validated config from its snapshot if the
+       snapshot is fresh (see :func:`compile_config`)
 
     4. overrides items in the config according to the command
        line option ``--override`` or ``-o`` (see
@@ -1298,6 +3700,23 @@ def set_up(program, version, spec, converters=None, argparser=None):
     if provided; else the :class:`argparse.ArgumentParser`
     returned by :func:`default_argparser` is used
 
+    `lazy`: if ``True``, config values are converted when first
+    read rather than up front (see :func:`validate_config`)
+
+    `profile`: if ``True``, or if the command line option
+    ``--profile-converters`` is given, the time taken by each
+    converter is reported when the program exits
+    (see :func:`enable_profiling`)
+
+    `timings`: if ``True``, or if the command line option
+    ``--timings`` is given, the time taken by each phase of
+    this function (and by importing phyles) is printed to
+    stderr after the banner
+
+    `snapshots`: if ``True``, a fresh snapshot of the config
+    file (see :func:`compile_config`) is loaded instead of
+    reading and validating the config file, and overrides are
+    applied to it with :func:`revalidate`
 
   Returns: a :class:`dict` with the keys:
 
@@ -1311,33 +3730,67 @@ def set_up(program, version, spec, converters=None, argparser=None):
 
       4. ``'config'``: the configuration
          as a :class:`Configuration`
+
+      5. ``'timings'``: an :class:`OrderedDict` of the seconds
+         taken by each phase (``'import phyles'``,
+         ``'argparser'``, ``'parse args'``, ``'load schema'``,
+         ``'read config'``, ``'overrides'``, and ``'validate'``,
+         or ``'load snapshot'`` and ``'overrides'`` if the config
+         comes from a snapshot), whether or not `timings` is
+         ``True``
   """
+  timer = _PhaseTimer()
+  if _import_seconds is not None:
+    timer.phases['import phyles'] = _import_seconds
   if argparser is None:
     parser = default_argparser()
   else:
     parser = argparser
+  timer.mark('argparser')
   args = parser.parse_args()
+  timer.mark('parse args')
+  timings = timings or getattr(args, "timings", False)
+  if profile or getattr(args, "profile_converters", False):
+    enable_profiling(report_at_exit=True)
+  import yaml
   try:
     schema = load_schema(spec, converters=converters)
   except yaml.constructor.ConstructorError as e:
     _schema_error(e)
+  timer.mark('load schema')
   if hasattr(args, "template"):
     if args.template:
-      print schema.sample_config()
+      write_sample_config(schema, sys.stdout)
+      sys.stdout.write("\n")
       sys.exit()
     else:
       banner(program, version)
+      timer.last = time.time()
       try:
-        cfg = read_cfg(args.config)
+        config = None
+        if snapshots:
+          config = load_snapshot(schema, args.config)
+        if config is not None:
+          timer.mark('load snapshot')
+        else:
+          cfg = read_cfg(args.config)
+          timer.mark('read config')
         if args.override is not None:
           override_cfg = parse_override(args.override)
           for k in override_cfg:
             if k in schema:
-              cfg[k] = override_cfg[k]
+              if config is None:
+                cfg[k] = override_cfg[k]
             else:
               msg = "Command line option '%s' for is not valid." % k
               raise ConfigError(msg)
-        config = schema.validate_config(cfg)
+          if config is not None:
+            config = revalidate(schema, config, override_cfg,
+                                inplace=True)
+        timer.mark('overrides')
+        if config is None:
+          config = schema.validate_config(cfg, lazy=lazy)
+          timer.mark('validate')
       except (ConfigError, OptionError,
               yaml.constructor.ConstructorError) as e:
         usage(parser, e)
@@ -1345,10 +3798,50 @@ def set_up(program, version, spec, converters=None, argparser=None):
     banner(program, version)
     schema = Schema()
     config = Configuration()
+  if timings:
+    timer.report()
   return {'argparser': parser,
           'args': args,
           'schema': schema,
-          'config': config}
+          'config': config,
+          'timings': timer.phases}
+
+def read_resource(package_name, resource):
+  """
+  Returns the contents of the file `resource` in the package
+  named `package_name`, or ``None`` if it can't be found, without
+  scanning the installed distributions like :mod:`pkg_resources`
+  does.
+
+  The file is read by the loader of the package with
+  :func:`pkgutil.get_data`, which also works for packages
+  installed as zip files (eggs) and for frozen executables whose
+  loaders can read data. Only if the package has no such loader
+  is :mod:`pkg_resources` imported to read the file.
+
+  Args:
+    `package_name`: the name of the package, e.g. ``'phyles'``
+
+    `resource`: the path to the file relative to the package
+                directory, with ``/`` as the separator, e.g.
+                ``'package-data/quickstart-schema.yml'``
+
+  Returns: the contents of the file as a :class:`str` or ``None``
+  """
+  import pkgutil
+  try:
+    result = pkgutil.get_data(package_name, resource)
+  except (IOError, OSError):
+    return None
+  except ImportError:
+    result = None
+  if result is None:
+    try:
+      import pkg_resources
+      result = pkg_resources.resource_string(package_name, resource)
+    except (ImportError, IOError, OSError):
+      return None
+  return result
 
 def package_spec(env_var, package_name, data_dir, specfile_name):
   """
@@ -1359,8 +3852,10 @@ def package_spec(env_var, package_name, data_dir, specfile_name):
   This function pulls out all the stops to find the specification.
   It is best to try to give all of `env_var`, `package_name`,
   and `data_dir` if they are available to have the best chance
-  of finding the path to the specification file. See
-  :func:`get_data_path` for a full description.
+  of finding the path to the specification file. The file
+  is first read from the package with :func:`read_resource`,
+  and only if that fails looked for with :func:`get_data_path`.
+  See :func:`get_data_path` for a full description.
 
   Args:
     The arguments `env_var`, `package_name`, and `data_dir` are
@@ -1372,16 +3867,111 @@ def package_spec(env_var, package_name, data_dir, specfile_name):
   Returns:
     A YAML string specifying the schema.
   """
-  try:
-     p = os.path.join(data_dir, specfile_name)
-     result = pkg_resources.resource_string(package_name, p)
-  except IOError:
+  result = read_resource(package_name, "/".join([data_dir, specfile_name]))
+  if result is None:
      dirpath = get_data_path(env_var, package_name, data_dir)
      filepath = os.path.join(dirpath, specfile_name)
      with open(filepath) as f:
        result = f.read()
   return result
 
+"""
+Schemata loaded by get_schema, with the converters they
+were loaded with, keyed as described in get_schema.
+"""
+_schemas = {}
+_schemas_lock = threading.RLock()
+
+def get_schema(env_var, package_name, data_dir, specfile_name,
+               converters=None, **kwargs):
+  """
+  Returns the schema specified in a file in a package, loading
+  it only the first time it is asked for. Later calls with the
+  same arguments, from any thread, get the same :class:`Schema`,
+  which is frozen (see :meth:`Schema.freeze`) so that it can be
+  shared safely. If several threads ask for a schema at once
+  before it is loaded, it is still loaded only once.
+
+  Schemata are told apart by all of the arguments, with
+  `converters` compared by identity, so the same
+  :class:`dict` of converters should be passed each time.
+
+  Args:
+    The arguments `env_var`, `package_name`, `data_dir`, and
+    `specfile_name` are identical to those of
+    :func:`package_spec`, and `converters` and the
+    keyword arguments are passed to :func:`load_schema`.
+
+  Returns:
+    A frozen :class:`Schema`.
+
+  .. doctest::
+
+    >>> schema = phyles.get_schema('MYPROG_DATA', 'myprog',
+                                   'package-data', 'schema.yml',
+                                   converters=CONVERTERS)
+    >>> schema is phyles.get_schema('MYPROG_DATA', 'myprog',
+                                    'package-data', 'schema.yml',
+                                    converters=CONVERTERS)
+    True
+  """
+  key = (env_var, package_name, data_dir, specfile_name,
+         id(converters), tuple(sorted(kwargs.items())))
+  entry = _schemas.get(key)
+  if entry is None:
+    with _schemas_lock:
+      entry = _schemas.get(key)
+      if entry is None:
+        spec = package_spec(env_var, package_name,
+                            data_dir, specfile_name)
+        schema = load_schema(spec, converters, **kwargs).freeze()
+        # converters are kept so that their id can't be reused
+        entry = _schemas[key] = (converters, schema)
+  return entry[1]
+
+def clear_schemas():
+  """
+  Forgets the schemata loaded by :func:`get_schema`, so
+  that each is loaded again the next time it is asked for.
+  """
+  with _schemas_lock:
+    _schemas.clear()
+
+def _parse_choices(text):
+  """
+  Returns the choices in `text`, one per line, ignoring
+  blank lines and lines starting with ``#``.
+  """
+  choices = []
+  for line in text.splitlines():
+    line = line.strip()
+    if line and not line.startswith("#"):
+      choices.append(line)
+  return choices
+
+def read_choices(path):
+  """
+  Returns a :class:`Choices` converter for the choices listed
+  in the file named `path`, one per line. Blank lines and
+  lines that start with ``#`` are ignored. The file is
+  not read until the choices are first needed.
+  """
+  def _loader():
+    with open(path) as f:
+      return _parse_choices(f.read())
+  return Choices(_loader, source="'%s'" % os.path.basename(path))
+
+def package_choices(env_var, package_name, data_dir, choices_name):
+  """
+  Like :func:`read_choices`, but for a file named `choices_name`
+  found with the package contents, as for :func:`package_spec`
+  (see :func:`package_spec` for a description of the arguments).
+  """
+  def _loader():
+    text = package_spec(env_var, package_name, data_dir, choices_name)
+    return _parse_choices(text)
+  return Choices(_loader, source="'%s'" % choices_name)
+
 def prune(patterns, doit=False):
   """
   Recursively deletes files matching the specified unix style
@@ -1407,6 +3997,8 @@ def prune(patterns, doit=False):
     erasing = "Erasing: %s"
   else:
     erasing = "Would erase: %s"
+  import glob
+  import logging
   for (path, dirs, files) in os.walk('.'):
     g = []
     for pattern in patterns:
@@ -1459,6 +4051,7 @@ def _unpack_skeleton(config):
    config['package_header'] = "\n".join([hline, title, hline])
    zip_path = os.path.join(config['data_dir'],
                            config['zip_name'])
+   from zipfile import ZipFile
    z = ZipFile(zip_path, 'r')
    extension = config['extension']
    last = -(len(extension) + 1)
@@ -1578,6 +4171,7 @@ def mapify(f):
   y is: 4
   args are: (7, 8)
   """
+  import inspect
   a = inspect.getargspec(f)
   args = a.args
   varargs = a.varargs
@@ -1607,6 +4201,7 @@ def preserve_original(apath):
   if os.path.exists(apath):
     bak = apath + ".orig"
     msg = "File '%s' exists. Renaming to '%s'."
+    import logging
     logging.warning(msg, apath, bak)
     os.rename(apath, bak)
 
@@ -1691,6 +4286,51 @@ def _quickstart():
   config['extension'] = PHYLES_TEMPLATE
   run_main(_quickstart_main, config)
 
+def _compile_config():
+  """
+  The ``phyles-compile-config`` command (see :func:`compile_config`).
+  """
+  import argparse
+  parser = argparse.ArgumentParser(
+             prog="phyles-compile-config",
+             description="Validates a config file with a schema and " +
+                         "writes a snapshot of the validated config, " +
+                         "which set_up(snapshots=True) loads instead " +
+                         "of the config file while neither changes.")
+  parser.add_argument("spec",
+                      help="YAML file holding the schema specification, " +
+                           "or 'package:resource' for one in a package")
+  parser.add_argument("config", help="config file to validate")
+  parser.add_argument("-c", "--converters", default=None,
+                      metavar="MODULE:NAME",
+                      help="the dict of converters for the schema, " +
+                           "e.g. 'myprogram.main:CONVERTERS'")
+  parser.add_argument("-o", "--output", default=None,
+                      help="snapshot file (default: the config " +
+                           "file name followed by '%s')" % SNAPSHOT_SUFFIX)
+  args = parser.parse_args()
+  try:
+    converters = None
+    if args.converters is not None:
+      try:
+        converters = _resolve_ref(args.converters)
+      except (ImportError, AttributeError, ValueError) as e:
+        msg = "Can't find converters '%s' (%s)." % (args.converters, e)
+        raise ConfigError(msg)
+    if os.path.exists(args.spec) or ":" not in args.spec:
+      schema = read_schema(args.spec, converters=converters)
+    else:
+      package_name, _, resource = args.spec.partition(":")
+      spec = read_resource(package_name, resource)
+      if spec is None:
+        raise ConfigError("Can't find schema '%s'." % args.spec)
+      schema = load_schema(spec, converters=converters)
+    snapshot_file = _snapshot_name(args.config, args.output)
+    compile_config(schema, args.config, snapshot_file)
+  except ConfigError as e:
+    usage(parser, e)
+  print "Wrote snapshot '%s'." % snapshot_file
+
 def zipdir(basedir, archivename):
     """
     Uses python zipfile package to create a zip archive of
@@ -1714,6 +4354,8 @@ def zipdir(basedir, archivename):
 
     length_basedir = len(basedir)
     length_pfx = length_basedir + len(os.sep)
+    from contextlib import closing
+    from zipfile import ZipFile, ZIP_DEFLATED
     with closing(ZipFile(archivename, "w", ZIP_DEFLATED)) as z:
       for root, dirs, files in os.walk(basedir):
         if files:
@@ -0,0 +1,293 @@
+#! /usr/bin/env python
+
+"""
+Reloading of config files as they change, for programs
+that run for a long time (see :class:`ConfigWatcher`).
+"""
+
+import os
+import errno
+import select
+import time
+import struct
+import hashlib
+import threading
+
+from _phyles import ConfigError, validate_config, _parse_cfg
+
+"""
+inotify masks (see inotify(7)) for the directory holding the
+config, so that editors that replace the file are also seen.
+"""
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+_IN_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE)
+_IN_EVENT = struct.Struct("iIII")
+
+class _Inotify(object):
+  """
+  A minimal inotify watch of one directory, through :mod:`ctypes`.
+  Raises :class:`OSError` where inotify is not available.
+  """
+  def __init__(self, directory):
+    import ctypes
+    import ctypes.util
+    try:
+      libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                         use_errno=True)
+      init = libc.inotify_init1
+      add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError) as e:
+      raise OSError(errno.ENOSYS, "inotify is not available: %s" % e)
+    self.fd = init(IN_NONBLOCK)
+    if self.fd < 0:
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err))
+    if add_watch(self.fd, directory, _IN_MASK) < 0:
+      err = ctypes.get_errno()
+      os.close(self.fd)
+      raise OSError(err, os.strerror(err))
+  def wait(self, timeout):
+    """
+    Returns the names of the entries of the directory that
+    changed within `timeout` seconds (``None`` if the event queue
+    overflowed, in which case anything may have changed).
+    """
+    ready, _, _ = select.select([self.fd], [], [], timeout)
+    if not ready:
+      return []
+    try:
+      data = os.read(self.fd, 65536)
+    except OSError as e:
+      if e.errno == errno.EAGAIN:
+        return []
+      raise
+    names = []
+    i = 0
+    while i + _IN_EVENT.size <= len(data):
+      _, mask, _, length = _IN_EVENT.unpack_from(data, i)
+      i += _IN_EVENT.size
+      if mask & IN_Q_OVERFLOW:
+        return None
+      names.append(data[i:i + length].rstrip("\0"))
+      i += length
+    return names
+  def close(self):
+    os.close(self.fd)
+
+class ConfigWatcher(object):
+  """
+  Watches a config file (in any format :func:`read_config`
+  reads), and, each time it changes, validates it with a
+  schema and gives the new config to `callback`. Changes are
+  seen with inotify on Linux, or otherwise by checking the file
+  every `interval` seconds.
+
+  The file is read only if its size, modification time, or
+  inode changed, and is parsed and validated only if its
+  content (by SHA-1) differs from that of the last good
+  config, so touching the file or saving it unchanged does
+  nothing. Bursts of changes (e.g. an editor writing the file
+  in steps) are collapsed by waiting until the file has not
+  changed for `debounce` seconds.
+
+  A config that can not be read or does not validate is given
+  to `on_error` as the exception, and never replaces the last
+  good config, which is always :attr:`config`. With `lazy`,
+  every value is still converted (see
+  :meth:`LazyConfiguration.force`) before the config is taken.
+  An exception raised by `callback` is also given to
+  `on_error`, and the file is still watched.
+
+  Args:
+    `schema`: a :class:`Schema` as described in :func:`load_schema`
+
+    `config_file`: the name of the config file
+
+    `callback`: called with each new valid config, as returned
+                by :func:`validate_config`
+
+    `on_error`: called with the exception (e.g.
+                :class:`ConfigError`) if a changed file does not
+                give a valid config, or if `callback` raises one;
+                the default is to log a warning
+
+    `interval`: seconds between checks of the file when polling,
+                and between safety checks when using inotify
+
+    `debounce`: seconds the file must be left alone before it
+                is read
+
+    `lazy`: passed to :func:`validate_config`
+
+    `inotify`: if ``False``, the file is polled even where
+               inotify is available
+
+  Attributes:
+    `config`: the last good config, or ``None`` if no good
+              config has been read yet
+
+  .. doctest::
+
+    >>> def reconfigure(config):
+    ...   server.workers = config['workers']
+    >>> watcher = phyles.ConfigWatcher(schema, 'server.yml',
+    ...                                reconfigure)
+    >>> watcher.start()
+    >>> watcher.config['workers']
+    4
+    >>> watcher.stop()
+  """
+  def __init__(self, schema, config_file, callback, on_error=None,
+                     interval=1.0, debounce=0.2, lazy=False,
+                     inotify=True):
+    self.schema = schema
+    self.config_file = os.path.abspath(config_file)
+    self.callback = callback
+    if on_error is None:
+      on_error = self._log_error
+    self.on_error = on_error
+    self.interval = interval
+    self.debounce = debounce
+    self.lazy = lazy
+    self.inotify = inotify
+    self.config = None
+    self._signature = None
+    self._digest = None
+    self._lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread = None
+  def _log_error(self, e):
+    import logging
+    logging.warning('Problem reloading "%s": %s', self.config_file, e)
+  def _stat(self):
+    try:
+      st = os.stat(self.config_file)
+    except OSError:
+      return None
+    return (st.st_ino, st.st_size, st.st_mtime)
+  def check(self):
+    """
+    Reloads the config if the file changed since it was last
+    read, and returns ``True`` if a new good config was given
+    to `callback`. Called by the watching thread, but may also
+    be called directly, e.g. without :meth:`start`.
+    """
+    import yaml
+    with self._lock:
+      signature = self._stat()
+      if signature == self._signature:
+        return False
+      self._signature = signature
+      try:
+        if signature is None:
+          msg = 'Settings file "%s" does not exist.' % self.config_file
+          raise ConfigError(msg)
+        with open(self.config_file, "rb") as f:
+          data = f.read()
+        digest = hashlib.sha1(data).digest()
+        if digest == self._digest:
+          return False
+        cfg = _parse_cfg(self.config_file, data)
+        if not hasattr(cfg, 'keys'):
+          raise ConfigError("Configuration is not a mapping.")
+        config = validate_config(self.schema, cfg, lazy=self.lazy)
+        if self.lazy:
+          # a bad value must not replace the last good config
+          config.force()
+      except (ConfigError, yaml.YAMLError, IOError, OSError) as e:
+        self.on_error(e)
+        return False
+      # remembered only once good, so failed content is tried again
+      self._digest = digest
+      self.config = config
+    try:
+      self.callback(config)
+    except Exception as e:
+      # the watching thread must outlive a failing callback
+      self.on_error(e)
+    return True
+  def _settle(self):
+    """
+    Waits until the file has not changed for `debounce` seconds.
+    """
+    signature = self._stat()
+    while not self._stop.wait(self.debounce):
+      current = self._stat()
+      if current == signature:
+        return
+      signature = current
+  def _poll(self):
+    while not self._stop.wait(self.interval):
+      if self._stat() != self._signature:
+        self._settle()
+        if not self._stop.is_set():
+          self.check()
+  def _watch(self, watch):
+    directory, name = os.path.split(self.config_file)
+    try:
+      while not self._stop.is_set():
+        names = watch.wait(self.interval)
+        if names is None or name in names:
+          # drain the burst, until the file is left alone for
+          # debounce seconds; other files changing is quiet
+          last = time.time()
+          while not self._stop.is_set():
+            left = last + self.debounce - time.time()
+            if left <= 0:
+              break
+            names = watch.wait(left)
+            if names is None or name in names:
+              last = time.time()
+        if not self._stop.is_set():
+          self.check()
+    finally:
+      watch.close()
+  def start(self):
+    """
+    Reads the config (giving it to `callback` if it is good)
+    and starts watching the file in a daemon thread.
+    Returns the watcher.
+    """
+    if self._thread is not None:
+      return self
+    self._stop.clear()
+    self.check()
+    run = self._poll
+    args = ()
+    if self.inotify:
+      try:
+        watch = _Inotify(os.path.dirname(self.config_file))
+      except OSError as e:
+        import logging
+        logging.debug("Polling '%s': %s", self.config_file, e)
+      else:
+        run = self._watch
+        args = (watch,)
+    self._thread = threading.Thread(target=run, args=args,
+                                    name="ConfigWatcher")
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+  def stop(self, timeout=None):
+    """
+    Stops watching, waiting up to `timeout` seconds
+    for the watching thread to finish.
+    """
+    if self._thread is None:
+      return
+    self._stop.set()
+    self._thread.join(timeout)
+    self._thread = None
+  def __enter__(self):
+    return self.start()
+  def __exit__(self, *exc_info):
+    self.stop()
@@ -30,5 +30,6 @@ setup(name = info['PACKAGE'],
       entry_points = {
         'console_scripts' : [
             'phyles-pack-skeleton = phyles._phyles:_pack_skeleton',
-            'phyles-quickstart = phyles._phyles:_quickstart']}
+            'phyles-quickstart = phyles._phyles:_quickstart',
+            'phyles-compile-config = phyles._phyles:_compile_config']}
       )